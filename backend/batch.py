@@ -0,0 +1,171 @@
+import asyncio
+import os
+import time
+import uuid
+from .corelogic import (
+    get_answer_ultra_fast, get_answer_fast, get_answer_deep, get_answer_auto, new_deadline
+)
+
+BATCH_MODES = ("ultra", "serp", "deep", "auto")
+# Upper bound on batch questions answered at once across all jobs; a job may ask for fewer
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+# Finished jobs kept in memory for polling
+MAX_FINISHED_JOBS = 100
+
+ANSWER_FUNCTIONS = {
+    "ultra": get_answer_ultra_fast,
+    "serp": get_answer_fast,
+    "deep": get_answer_deep,
+}
+
+jobs = {}
+# Shared by every job, so concurrent jobs don't multiply the limit
+pipeline_slots = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+
+def normalize_question(question):
+    return " ".join(question.lower().split())
+
+
+class BatchJob:
+    def __init__(self, questions, mode, concurrency, budget=None):
+        self.id = uuid.uuid4().hex
+        self.questions = questions
+        self.mode = mode
+        self.concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+        self.budget = budget  # per-question latency budget; None uses the mode's default
+        self.status = "queued"
+        self.results = [None] * len(questions)
+        self.completion_order = []  # result indices, in the order they finished
+        self.failed = 0
+        self.truncated = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.changed = asyncio.Condition()
+        self.task = None
+
+    def progress(self):
+        completed = len(self.completion_order)
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "mode": self.mode,
+            "total": len(self.questions),
+            "unique_questions": len({normalize_question(q) for q in self.questions}),
+            "completed": completed,
+            "failed": self.failed,
+            "truncated": self.truncated,
+            "elapsed_seconds": round(elapsed, 2),
+            "questions_per_minute": round(completed / elapsed * 60, 1) if elapsed else 0.0,
+        }
+
+    def page(self, offset=0, limit=50):
+        indices = self.completion_order[offset:offset + limit]
+        return [self.results[i] for i in indices]
+
+    async def _set_result(self, index, result):
+        self.results[index] = result
+        self.completion_order.append(index)
+        async with self.changed:
+            self.changed.notify_all()
+
+
+def answer_fallback(degradations):
+    """How the answer stage itself degraded, if it did"""
+    return next((d["fallback"] for d in degradations if d["stage"] == "answer"), None)
+
+
+async def answer_question(question, mode, budget=None):
+    """Run one question through the normal pipeline and collect the full answer"""
+    deadline = new_deadline("deep" if mode == "auto" else mode, budget)
+    if mode == "auto":
+        answer_stream, urls, follow_up_questions, mode = await get_answer_auto(question, deadline)
+    else:
+        answer_stream, urls, follow_up_questions = await ANSWER_FUNCTIONS[mode](question, deadline)
+    answer = "".join([chunk async for chunk in answer_stream])
+    fallback = answer_fallback(deadline.degradations)
+    # A pipeline error or the LLM-unavailable notice is not an answer
+    failed = getattr(answer_stream, "failed", False) or fallback == "unavailable notice"
+    return {
+        "error": answer if failed else None,
+        "truncated": fallback == "truncated answer",
+        "mode": mode,
+        "answer": answer,
+        "urls": urls,
+        "follow_up_questions": follow_up_questions,
+        "degradations": deadline.degradations,
+    }
+
+
+async def run_job(job):
+    """Answer each distinct question once under the job's concurrency limit.
+
+    Searches, page fetches and embeddings shared between questions are
+    deduplicated by the caches and in-flight tracking in corelogic.
+    """
+    job.status = "running"
+    job.started_at = time.time()
+
+    groups = {}
+    for index, question in enumerate(job.questions):
+        groups.setdefault(normalize_question(question), []).append(index)
+
+    semaphore = asyncio.Semaphore(job.concurrency)
+
+    async def run_group(indices):
+        question = job.questions[indices[0]]
+        async with semaphore, pipeline_slots:
+            try:
+                result = await answer_question(question, job.mode, job.budget)
+            except Exception as e:
+                print(f"Error in batch {job.id} for '{question}': {e}")
+                result = {"error": "An error occurred while processing this question."}
+        for index in indices:
+            if result["error"]:
+                job.failed += 1
+            elif result.get("truncated"):
+                job.truncated += 1
+            await job._set_result(index, {"index": index, "question": job.questions[index], **result})
+
+    try:
+        await asyncio.gather(*(run_group(indices) for indices in groups.values()))
+        job.status = "done"
+    except asyncio.CancelledError:
+        job.status = "cancelled"
+        raise
+    finally:
+        job.finished_at = time.time()
+        async with job.changed:
+            job.changed.notify_all()
+        print(f"Batch {job.id} {job.status}: {job.progress()}")
+
+
+def create_job(questions, mode, concurrency=BATCH_MAX_CONCURRENCY, budget=None):
+    if mode not in BATCH_MODES:
+        raise ValueError(f"Unknown mode '{mode}', expected one of {', '.join(BATCH_MODES)}")
+    finished = [j for j in jobs.values() if j.finished_at]
+    for old in sorted(finished, key=lambda j: j.finished_at)[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        jobs.pop(old.id, None)
+
+    job = BatchJob(questions, mode, concurrency, budget)
+    jobs[job.id] = job
+    job.task = asyncio.create_task(run_job(job))
+    return job
+
+
+async def iter_results(job):
+    """Yield results as they complete until the job finishes"""
+    sent = 0
+    while True:
+        async with job.changed:
+            await job.changed.wait_for(
+                lambda: sent < len(job.completion_order) or job.finished_at
+            )
+        while sent < len(job.completion_order):
+            yield job.results[job.completion_order[sent]]
+            sent += 1
+        if job.finished_at and sent >= len(job.completion_order):
+            return
@@ -0,0 +1,53 @@
+# backend/bench_batch.py
+# Questions per minute: one-by-one /api/ask-<mode> calls vs a single /api/batch job.
+# Run against a live server, once per path, restarting it in between so both start cold:
+#   python -m backend.bench_batch http://localhost:8000 questions.txt deep sequential
+#   python -m backend.bench_batch http://localhost:8000 questions.txt deep batch
+import sys
+import time
+import requests
+
+ENDPOINTS = {"ultra": "/api/ask", "serp": "/api/ask-serp", "deep": "/api/ask-deep", "auto": "/api/ask-auto"}
+
+
+def run_sequential(base_url, questions, mode):
+    start = time.perf_counter()
+    for question in questions:
+        with requests.post(base_url + ENDPOINTS[mode], json={"question": question}, stream=True) as response:
+            for line in response.iter_lines():
+                if line == b"data: [DONE]":
+                    break
+    return time.perf_counter() - start
+
+
+def run_batch(base_url, questions, mode, concurrency):
+    start = time.perf_counter()
+    job = requests.post(
+        base_url + "/api/batch",
+        json={"questions": questions, "mode": mode, "concurrency": concurrency}
+    ).json()
+    while True:
+        progress = requests.get(f"{base_url}/api/batch/{job['job_id']}", params={"limit": 0}).json()
+        if progress["status"] in ("done", "cancelled"):
+            break
+        time.sleep(0.5)
+    return time.perf_counter() - start, progress
+
+
+if __name__ == "__main__":
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+    with open(sys.argv[2]) as f:
+        questions = [line.strip() for line in f if line.strip()]
+    mode = sys.argv[3] if len(sys.argv) > 3 else "deep"
+    which = sys.argv[4] if len(sys.argv) > 4 else "batch"
+
+    if which == "sequential":
+        elapsed = run_sequential(base_url, questions, mode)
+        print(f"per-request: {len(questions)} questions in {elapsed:.1f}s "
+              f"({len(questions) / elapsed * 60:.1f} questions/min)")
+    else:
+        elapsed, progress = run_batch(base_url, questions, mode, concurrency=8)
+        print(f"batch:       {len(questions)} questions in {elapsed:.1f}s "
+              f"({len(questions) / elapsed * 60:.1f} questions/min, "
+              f"{progress['unique_questions']} unique, {progress['failed']} failed, "
+              f"{progress['truncated']} truncated)")
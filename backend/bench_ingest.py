@@ -0,0 +1,118 @@
+# backend/bench_ingest.py
+# Embedding calls and tokens with and without the ingest filter on a fixture corpus.
+# The baseline chunks by fixed word windows, as chunk_text does; the filtered path
+# uses the filter's paragraph-aligned chunks. Counts tokens without tiktoken so it
+# runs offline.
+from collections import Counter
+from backend.dedup import IngestFilter, estimate_tokens
+
+COOKIE_BANNER = "We use cookies to improve your experience. By continuing to browse you accept our cookie policy."
+NAV = "Home News Sport Business Technology Science Health Subscribe Sign in to your account today"
+FOOTER = "Copyright 2026 Example Media Group. All rights reserved. Terms of use and privacy notice apply."
+
+ARTICLE = (
+    "Researchers announced a solid state battery cell that retains ninety percent of its capacity "
+    "after two thousand charge cycles. The cell uses a sulfide electrolyte and a lithium metal anode. "
+    "The team says manufacturing costs remain the main obstacle to commercial use, and pilot production "
+    "is planned for next year with an automotive partner. Independent experts cautioned that lab results "
+    "often fail to carry over to large format cells used in vehicles, where heat and pressure differ. "
+)
+OTHER = (
+    "Lithium iron phosphate batteries trade energy density for lower cost and longer life. They dominate "
+    "stationary storage and entry level electric cars, and avoid nickel and cobalt supply constraints. "
+    "Manufacturers continue to improve cell to pack designs that close part of the density gap. "
+)
+
+
+WIRE = [  # one agency story, ~30-word paragraphs, carried by several outlets
+    "The regional grid operator approved a plan on Tuesday to add four gigawatts of battery storage by 2030, "
+    "the largest single procurement of its kind in the country so far.",
+    "Officials said the batteries would absorb surplus solar power at midday and release it during the evening "
+    "peak, when demand regularly pushes wholesale prices to their highest levels.",
+    "The plan allocates contracts through three auctions, the first of which opens in March and is expected to "
+    "favour projects that can connect to existing substations without new transmission lines.",
+    "Consumer groups welcomed the decision but warned that the cost of the contracts would eventually appear on "
+    "household bills unless the auctions attract strong competition from developers.",
+    "Developers have already filed applications for more than nine gigawatts of projects, according to the "
+    "operator, although many are unlikely to secure financing or planning permission in time.",
+    "Most of the proposed sites are near retiring coal plants, where grid connections and cooling water rights "
+    "are already in place and local councils are eager to replace lost jobs.",
+    "Engineers at the operator said four hour lithium iron phosphate systems were the likely default, with a "
+    "smaller share reserved for longer duration technologies such as flow batteries.",
+    "Analysts noted that similar programs abroad had cut evening price spikes by a third within two years, "
+    "while also reducing how often gas peaking plants had to be started.",
+    "Environmental groups asked the operator to require recycling plans for every project, citing concerns about "
+    "end of life disposal as the first generation of large installations ages.",
+    "A final decision on the auction rules is due in January after a public consultation, and the operator said "
+    "it would publish the bidding results for each round within six weeks.",
+]
+
+
+def page(body, extra=""):
+    return "\n".join([NAV, COOKIE_BANNER, body + extra, FOOTER])
+
+
+def wire_page(intro, outro):
+    return "\n".join([intro, *WIRE, outro])
+
+
+REQUESTS = [
+    [
+        ("https://news.example/battery", page(ARTICLE * 3)),
+        ("https://daily.example/battery", page(ARTICLE * 3, " Updated at 10:42.")),  # syndicated copy
+        ("https://news.example/lfp", page(OTHER * 3)),
+        ("https://news.example/markets", page(OTHER + ARTICLE)),  # third page with news.example's template
+    ],
+    [
+        ("https://news.example/battery", page(ARTICLE * 3, " Updated at 15:07.")),  # same story, next request
+        ("https://daily.example/storage", page(OTHER * 2 + ARTICLE)),
+    ],
+    [  # the same wire story behind different intros and outros: kept once, not stripped as boilerplate
+        ("https://herald.example/grid", wire_page(
+            "Herald staff report with agency copy. Local reaction is at the end of this article and on page six.",
+            "Readers in the northern districts can send questions about the new storage sites to our energy desk.")),
+        ("https://gazette.example/storage", wire_page(
+            "From the wires: the national grid is getting a very large battery build out, in brief.",
+            "The Gazette will follow the auctions closely. Sign up for the weekly climate and energy newsletter.")),
+    ],
+    [  # and again in a later request, from other outlets
+        ("https://courier.example/grid", wire_page(
+            "Agency report, lightly edited for our readers in the coastal region.",
+            "Our reporter will be at the consultation hearing in the capital next month.")),
+    ],
+]
+
+
+def chunk_words(text, size=60):
+    words = text.split()
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+
+if __name__ == "__main__":
+    ingest_filter = IngestFilter()
+    # Exact-match embedding caches for each path, kept across requests
+    baseline_seen, filtered_seen = set(), set()
+    for n, request in enumerate(REQUESTS, 1):
+        urls, pages = zip(*request)
+        baseline = [c for text in pages for c in chunk_words(text)]
+        baseline_calls = len(set(baseline) - baseline_seen)
+        baseline_seen.update(baseline)
+
+        stats = Counter()
+        cleaned = ingest_filter.clean_pages(pages, urls, stats)
+        chunks = ingest_filter.dedupe_chunks(
+            [c for text in cleaned for c in ingest_filter.chunk_page(text, split_long=chunk_words)], stats,
+            is_cached=lambda c: c in filtered_seen
+        )
+        # Near-duplicates of earlier chunks reuse their embedding
+        calls = len({c for c, similar in chunks if similar is None} - filtered_seen)
+        reused = sum(estimate_tokens(c) for c, _ in chunks if c in filtered_seen)
+        filtered_seen.update(c for c, _ in chunks)
+
+        kept = {p for text in cleaned for p in text.split("\n")}
+        wire = f", wire paragraphs kept {sum(p in kept for p in WIRE)}/{len(WIRE)}" if WIRE[0] in pages[0] else ""
+        print(f"request {n}: embedding calls {baseline_calls} -> {calls}, "
+              f"tokens {sum(map(estimate_tokens, baseline))} -> "
+              f"{sum(estimate_tokens(c) for c, _ in chunks)} ({reused} already embedded); "
+              f"pages dropped {stats['pages_dropped']}, boilerplate paragraphs "
+              f"{stats['boilerplate_paragraphs']}, chunks dropped {stats['chunks_dropped']}{wire}")
@@ -0,0 +1,95 @@
+# backend/bench_routing.py
+# Score the local mode classifier on a labeled set and estimate latency saved
+# against sending everything to deep mode. Pass a routing log to summarize live
+# traffic from the measured end-to-end latencies.
+import json
+import sys
+import time
+from collections import Counter
+from backend.mode_router import MODES, classify_question
+
+# Nominal per-mode latencies (seconds), from the endpoint docstrings; only for
+# the labeled-set estimate, the log summary uses measured latencies
+MODE_LATENCY = {"ultra": 1.5, "serp": 4.0, "deep": 10.0}
+
+LABELED = [
+    ("what is the boiling point of water at sea level", "ultra"),
+    ("explain recursion with a simple example", "ultra"),
+    ("who painted the mona lisa", "ultra"),
+    ("what is the difference between a list and a tuple in python", "ultra"),
+    ("how many bones are in the human body", "ultra"),
+    ("summarize the plot of hamlet", "ultra"),
+    ("what is the latest version of python", "serp"),
+    ("weather in new york tomorrow", "serp"),
+    ("current interest rate set by the federal reserve", "serp"),
+    ("who won the world cup final yesterday", "serp"),
+    ("tesla stock price today", "serp"),
+    ("news about the mars mission this week", "serp"),
+    ("compare the iphone and pixel cameras in detail", "deep"),
+    ("detailed analysis of remote work impact on productivity research", "deep"),
+    ("pros and cons of nuclear versus solar energy for grid storage", "deep"),
+    ("in depth review of the best laptops for machine learning this year", "deep"),
+    ("differences between gdpr and ccpa compliance requirements", "deep"),
+    ("analyze the trade-offs of event sourcing in large systems", "deep"),
+]
+
+
+def evaluate():
+    confusion = Counter()
+    correct = 0
+    start = time.perf_counter()
+    routed_latency = 0.0
+    for question, expected in LABELED:
+        mode, _, _ = classify_question(question)
+        confusion[(expected, mode)] += 1
+        correct += mode == expected
+        routed_latency += MODE_LATENCY[mode]
+    elapsed_ms = (time.perf_counter() - start) * 1000 / len(LABELED)
+
+    print(f"accuracy: {correct}/{len(LABELED)}  classify latency: {elapsed_ms:.3f} ms/question")
+    print("confusion (rows=expected, cols=predicted):")
+    print("        " + "".join(f"{m:>7}" for m in MODES))
+    for expected in MODES:
+        print(f"{expected:>7} " + "".join(f"{confusion[(expected, m)]:>7}" for m in MODES))
+
+    # Under-routing (deep question answered as ultra) costs quality, not latency
+    under_routed = sum(
+        n for (expected, mode), n in confusion.items() if MODES.index(mode) < MODES.index(expected)
+    )
+    always_deep = MODE_LATENCY["deep"] * len(LABELED)
+    print(f"estimated latency saved vs always-deep: {always_deep - routed_latency:.1f}s "
+          f"over {len(LABELED)} questions; under-routed: {under_routed}")
+
+
+def summarize_log(path):
+    with open(path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    entries = [e for e in entries if "latency_ms" in e]
+    if not entries:
+        print("routing log has no completed requests")
+        return
+    modes = Counter(e["mode"] for e in entries)
+    outcomes = Counter(e["outcome"] for e in entries)
+    escalated = sum(1 for e in entries if e["escalations"])
+    print(f"{len(entries)} routed requests: {dict(modes)}; escalated: {escalated}; outcomes: {dict(outcomes)}")
+
+    finished = [e for e in entries if e["outcome"] in ("ok", "degraded")]
+    latency = {}
+    for mode in MODES:
+        values = sorted(e["latency_ms"] / 1000 for e in finished if e["mode"] == mode)
+        if values:
+            latency[mode] = sum(values) / len(values)
+            print(f"  {mode:>5}: {len(values)} answered, mean {latency[mode]:.2f}s, "
+                  f"p50 {values[len(values) // 2]:.2f}s, max {values[-1]:.2f}s")
+    if "deep" not in latency:
+        print("no deep-mode answers logged; cannot compare against always-deep")
+        return
+    # Measured deep-mode latency stands in for what the cheaper requests would have taken
+    saved = sum(latency["deep"] - e["latency_ms"] / 1000 for e in finished if e["mode"] != "deep")
+    print(f"measured latency saved vs always-deep: {saved:.1f}s over {len(finished)} answered requests")
+
+
+if __name__ == "__main__":
+    evaluate()
+    if len(sys.argv) > 1:
+        summarize_log(sys.argv[1])
@@ -1,38 +1,252 @@
-from .scraper import scrape_urls_parallel
-from .summarizer import chunk_text, get_embedding
+from .scraper import scrape_urls_by_url
+from .summarizer import chunk_text, get_embedding, count_tokens
 from .faiss_store import FAISSStore
+from .hybrid_store import HybridStore
+from .pipeline import Pipeline
+from .prefetch import PrefetchWorker, CallBudget
+from .dedup import IngestFilter
+from .expiring_cache import ExpiringCache
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import openai
 from dotenv import load_dotenv
 import os
 import asyncio
 import hashlib
+import threading
+import time
 import json
 import aiohttp
-from .embedding_cache import load_cache, save_cache, get_or_embed
-from .serp_api import search_serpapi, search_serpapi_urls_only
+from .embedding_cache import load_cache, save_cache, get_or_embed, cache_key as embedding_key
+from .serp_api import search_serpapi
+from .mode_router import (
+    MIN_CONFIDENCE, classify_question, escalate, snippets_sufficient, routing_decision, log_routing_outcome
+)
+from .resilience import Deadline, get_breaker, site_breaker, call_with_breaker
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Past this, retrieval goes lexical-only instead of waiting on the embedding API
+# (the question is embedded at t=0, concurrently with search and scraping)
+QUERY_EMBEDDING_TIMEOUT = float(os.getenv("QUERY_EMBEDDING_TIMEOUT", "1.5"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "10"))
+KNOWLEDGE_BASE_TIMEOUT = float(os.getenv("KNOWLEDGE_BASE_TIMEOUT", "30"))
+# Past this, a new knowledge base is returned lexical-only and its vector
+# index is finished in the background
+CHUNK_EMBEDDING_TIMEOUT = float(os.getenv("CHUNK_EMBEDDING_TIMEOUT", "8"))
+FOLLOWUP_TIMEOUT = float(os.getenv("FOLLOWUP_TIMEOUT", "10"))
+# Longest wait for the LLM's first token, or between tokens
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))
+# Default end-to-end budget per mode (seconds); a request may carry its own
+REQUEST_BUDGETS = {
+    "ultra": float(os.getenv("ULTRA_BUDGET", "10")),
+    "serp": float(os.getenv("SERP_BUDGET", "15")),
+    "deep": float(os.getenv("DEEP_BUDGET", "30")),
+}
+# Budget held back for the answer LLM when sizing earlier stages
+LLM_RESERVE = float(os.getenv("LLM_RESERVE", "3"))
+# Search results deep mode scrapes
+DEEP_SEARCH_RESULTS = 3
+# With less budget than this left, deep mode scrapes proportionally fewer pages
+DEEP_FULL_SCRAPE_BUDGET = float(os.getenv("DEEP_FULL_SCRAPE_BUDGET", "15"))
+# Scraped pages kept in memory for reuse across questions (least recently used evicted)
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "500"))
+# Knowledge bases (FAISS index plus chunk texts) and search results kept in memory
+KNOWLEDGE_BASE_CACHE_SIZE = int(os.getenv("KNOWLEDGE_BASE_CACHE_SIZE", "100"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "5000"))
+# The embedding cache is written to disk at most this often (seconds)
+EMBEDDING_CACHE_SAVE_INTERVAL = float(os.getenv("EMBEDDING_CACHE_SAVE_INTERVAL", "60"))
+# Search results, pages and knowledge bases are refetched after this long (seconds)
+CACHE_TTL = float(os.getenv("CACHE_TTL", "1800"))
+# Prefetching refreshes entries this close to expiring, which keeps trending questions warm
+PREFETCH_REFRESH_WINDOW = float(os.getenv("PREFETCH_REFRESH_WINDOW", "300"))
+# Cap on search, page fetch and embedding calls spent on speculative prefetching
+PREFETCH_CALLS_PER_MINUTE = int(os.getenv("PREFETCH_CALLS_PER_MINUTE", "60"))
+
 # Simple in-memory cache for search results (use Redis in production)
-search_cache = {}
-knowledge_base_cache = {}
+search_cache = ExpiringCache(ttl=CACHE_TTL, max_entries=SEARCH_CACHE_SIZE)
+knowledge_base_cache = ExpiringCache(ttl=CACHE_TTL, max_entries=KNOWLEDGE_BASE_CACHE_SIZE)
+page_cache = ExpiringCache(ttl=CACHE_TTL, max_entries=PAGE_CACHE_SIZE)  # url -> scraped text
+embedding_cache = None  # loaded from disk once, shared across questions
+embedding_cache_saver = None  # pending write of the embedding cache
+cache_writer = ThreadPoolExecutor(max_workers=1)  # embedding cache writes, in order
+# Tasks for searches/page fetches currently running, so concurrent callers share them
+inflight = {}
+# Remembers boilerplate and chunk fingerprints across requests
+ingest_filter = IngestFilter(count_tokens=count_tokens)
+ingest_lock = threading.Lock()  # builds ingest in worker threads, one at a time
+
+# Stop calling upstreams that keep failing; sites get one breaker per domain
+search_breaker = get_breaker("search")
+embedding_breaker = get_breaker("embeddings")
+llm_breaker = get_breaker("llm")
 
 def get_cache_key(query):
     """Generate cache key for query"""
     return hashlib.md5(query.encode()).hexdigest()
 
 
-async def get_answer_ultra_fast(question):
-    """Ultra-fast approach using LLM knowledge + web context (1-2s response)"""
+def get_knowledge_base_key(urls):
+    return "_".join(sorted(urls))
+
+
+def new_deadline(mode, budget=None):
+    return Deadline(budget if budget is not None else REQUEST_BUDGETS[mode])
+
+
+async def guarded(breaker, make_coro, deadline, cap, reserve=0.0, count_timeout=True):
+    """Call an upstream under its breaker, within both `cap` and the deadline.
+
+    Pass count_timeout=False when `cap` is our own fast-path limit rather than
+    a sign the upstream is unhealthy.
+    """
+    timeout = deadline.timeout(cap, reserve) if deadline else cap
+    return await call_with_breaker(
+        breaker, make_coro, timeout=timeout, count_timeout=count_timeout and timeout >= cap
+    )
+
+
+def track_inflight(key, task):
+    inflight[key] = task
+    task.add_done_callback(lambda _: inflight.pop(key, None))
+    return task
+
+
+async def cached_search(cache_key, search_fn, *args, **kwargs):
+    """Run a blocking SERP lookup off the event loop, memoized in search_cache
+    and shared with concurrent callers asking for the same key"""
+    if cache_key in search_cache:
+        print("Using cached search results")
+        return search_cache[cache_key]
+    task = inflight.get(("search", cache_key))
+    if task is None:
+        task = track_inflight(
+            ("search", cache_key),
+            asyncio.ensure_future(asyncio.to_thread(search_fn, *args, **kwargs))
+        )
+    results = await asyncio.shield(task)
+    search_cache[cache_key] = results
+    print(f"Found {len(results)} search results")
+    return results
+
+
+async def fetch_pages(urls):
+    """Scrape only the URLs no other question has fetched or is fetching.
+
+    The site breaker is consulted here, where the fetch actually happens, so
+    a half-open site gets exactly one trial fetch; sites it turns away come
+    back as "".
+    """
+    to_fetch = [
+        url for url in urls
+        if url not in page_cache and ("page", url) not in inflight and site_breaker(url).allow()
+    ]
+    if to_fetch:
+        print(f"Scraping {len(to_fetch)} URLs in parallel...")
+        task = asyncio.ensure_future(scrape_urls_by_url(to_fetch))
+        task.add_done_callback(lambda task: store_pages(to_fetch, task))
+        for url in to_fetch:
+            track_inflight(("page", url), task)
+
+    pending = {inflight[("page", url)] for url in urls if ("page", url) in inflight}
+    for task in pending:
+        await asyncio.shield(task)
+
+    return [page_cache.get(url, "") for url in urls]
+
+
+def store_pages(urls, task):
+    """Cache a finished scrape and update the site breakers, even if the
+    request that started it has given up waiting. Only failed fetches count
+    against a site, not pages where no article text was found."""
+    if task.cancelled() or task.exception() is not None:
+        for url in urls:
+            site_breaker(url).trial_in_flight = False
+        return
+    for url, text in task.result().items():
+        if text is None:
+            site_breaker(url).record_failure()
+            continue
+        site_breaker(url).record_success()
+        if text:
+            page_cache[url] = text
+
+
+async def search_with_breaker(cache_key, search_fn, question, deadline=None, **kwargs):
+    """cached_search, but a miss goes through the search breaker and deadline"""
+    if cache_key in search_cache:
+        return await cached_search(cache_key, search_fn, question, **kwargs)
+    return await guarded(
+        search_breaker, lambda: cached_search(cache_key, search_fn, question, **kwargs),
+        deadline, SEARCH_TIMEOUT, reserve=LLM_RESERVE
+    )
+
+
+def scrapeable_urls(urls, deadline=None):
+    """Drop URLs whose site breaker is open. Half-open sites are kept; fetch_pages
+    lets only one trial through (claiming it here would leak if the page then
+    came from cache)."""
+    allowed = [url for url in urls if site_breaker(url).state != "open"]
+    if deadline is not None and len(allowed) < len(urls):
+        deadline.degrade("scrape", f"{len(allowed)} of {len(urls)} pages",
+                         f"skipped {len(urls) - len(allowed)} failing sites")
+    return allowed
+
+
+def snippet_context(search_results):
+    context_parts = []
+    urls = []
+    for result in search_results or []:
+        if result['snippet']:
+            context_parts.append(f"Source: {result['title']}\n{result['snippet']}")
+            urls.append(result['link'])
+    return context_parts, urls
+
+
+def note_stage_degradations(pipeline, deadline, fallbacks):
+    """Record optional stages that fell back to their default"""
+    for stage, fallback in fallbacks.items():
+        status = pipeline.status(stage)
+        if status in ("timeout", "failed", "skipped"):
+            deadline.degrade(stage, fallback, status)
+
+
+def get_embedding_cache():
+    global embedding_cache
+    if embedding_cache is None:
+        embedding_cache = load_cache()
+    return embedding_cache
+
+
+def save_embedding_cache_soon():
+    """Write the embedding cache at most once per interval, off the event loop"""
+    global embedding_cache_saver
+    if embedding_cache_saver is None or embedding_cache_saver.done():
+        embedding_cache_saver = asyncio.ensure_future(save_embedding_cache(EMBEDDING_CACHE_SAVE_INTERVAL))
+
+
+async def save_embedding_cache(delay=0.0):
+    await asyncio.sleep(delay)
+    snapshot = dict(get_embedding_cache())  # other builds may be adding entries
+    await asyncio.get_running_loop().run_in_executor(cache_writer, save_cache, snapshot)
+
+
+async def flush_embedding_cache():
+    """Write out a pending embedding cache save now (on shutdown)"""
+    if embedding_cache_saver is not None and not embedding_cache_saver.done():
+        embedding_cache_saver.cancel()
+        await save_embedding_cache()
+
+
+async def get_answer_ultra_fast(question, deadline=None, follow_up_questions=None):
+    """Ultra-fast approach using LLM knowledge + web context (1-2s response).
+
+    Modes falling back to this pass the follow-ups they already generated.
+    """
     try:
+        deadline = deadline or new_deadline("ultra")
         cache_key = get_cache_key(question + "_ultra")
-        
-        # Check cache first
-        if cache_key in search_cache:
-            print("Using cached ultra-fast result")
-            cached_result = search_cache[cache_key]
-            return cached_result['stream'], cached_result['urls'], cached_result['followups']
 
         # Use GPT-4o with enhanced prompting for current information
         prompt = f"""Answer the following question comprehensively using your knowledge. If the question requires very recent information (within the last few months), acknowledge what you might not know due to your knowledge cutoff and suggest what type of current sources would be helpful.
@@ -40,97 +254,233 @@ async def get_answer_ultra_fast(question):
 Question: {question}
 
 Provide a detailed, helpful answer. If you mention specific facts, dates, or statistics, indicate your confidence level or knowledge cutoff limitations where relevant."""
-
-        # Start follow-up generation in parallel
-        followup_task = asyncio.create_task(generate_follow_up_questions(question))
         
+        # Check cache first (streams can't be cached, so only the answer is regenerated)
+        if cache_key in search_cache:
+            print("Using cached ultra-fast result")
+            cached_result = search_cache[cache_key]
+            answer_stream = ask_llm_ultra_fast(prompt, deadline)
+            return answer_stream, cached_result['urls'], cached_result['followups']
+
         # Stream the answer
-        answer_stream = ask_llm_ultra_fast(prompt)
-        
-        # Wait for follow-up questions
-        follow_up_questions = await followup_task
-        
+        answer_stream = ask_llm_ultra_fast(prompt, deadline)
+
         # No sources for ultra-fast mode (uses LLM knowledge directly)
         urls = []
-        
-        # Cache the result structure (not the stream itself)
-        search_cache[cache_key] = {
-            'urls': urls,
-            'followups': follow_up_questions,
-            'stream': None  # Can't cache streams
-        }
-        
+
+        if follow_up_questions is not None:
+            return answer_stream, urls, follow_up_questions
+
+        pipeline = Pipeline("ultra")
+        pipeline.add("followups", lambda: generate_follow_up_questions(question),
+                     timeout=lambda: deadline.timeout(FOLLOWUP_TIMEOUT, reserve=LLM_RESERVE), default=[])
+        results = await pipeline.run()
+        note_stage_degradations(pipeline, deadline, {"followups": "no follow-up questions"})
+        follow_up_questions = results["followups"]
+
+        # Cache the result structure (not the stream itself), unless the
+        # follow-ups timed out or failed
+        if pipeline.status("followups") == "done" and follow_up_questions:
+            search_cache[cache_key] = {
+                'urls': urls,
+                'followups': follow_up_questions,
+                'stream': None  # Can't cache streams
+            }
+
         return answer_stream, urls, follow_up_questions
     except Exception as e:
         print(f"Error in ultra-fast answer: {e}")
-        error_stream = create_error_stream("An error occurred while processing your request.")
+        error_stream = create_error_stream("An error occurred while processing your request.", failed=True)
         return error_stream, [], []
 
 
-async def ask_llm_ultra_fast(prompt):
+llm_client = None
+
+
+def get_llm_client():
+    global llm_client
+    if llm_client is None:
+        llm_client = openai.AsyncOpenAI(api_key=openai.api_key)
+    return llm_client
+
+
+async def create_chat_completion(**kwargs):
+    # Async client: a stream holds no worker thread while it waits for tokens
+    return await get_llm_client().chat.completions.create(**kwargs)
+
+
+async def stream_chat_completion(deadline=None, **kwargs):
+    """Stream a chat completion without blocking the event loop between chunks.
+
+    Stops early, keeping what was already streamed, when the request's
+    deadline runs out; answers with a notice while the LLM breaker is open.
+    """
+    if not llm_breaker.allow():
+        if deadline is not None:
+            deadline.degrade("answer", "unavailable notice", "LLM circuit breaker open")
+        yield "The answer service is temporarily unavailable. Please try again shortly."
+        return
+
+    def next_timeout():
+        return deadline.timeout(LLM_TIMEOUT) if deadline is not None else LLM_TIMEOUT
+
+    received = False
+    response = None
+    try:
+        response = await asyncio.wait_for(
+            create_chat_completion(stream=True, **kwargs), timeout=next_timeout()
+        )
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=next_timeout())
+            except StopAsyncIteration:
+                break
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                received = True
+                yield chunk.choices[0].delta.content
+    except asyncio.TimeoutError:
+        if deadline is not None and deadline.expired():
+            # Our budget ran out; that says nothing bad about the LLM
+            deadline.degrade("answer", "truncated answer", "request deadline reached")
+            if received:
+                llm_breaker.record_success()
+            return
+        llm_breaker.record_failure()
+        raise
+    except Exception:
+        llm_breaker.record_failure()
+        raise
+    finally:
+        # Also on client disconnect (GeneratorExit/CancelledError), which
+        # would otherwise leave a half-open breaker's trial claimed for good
+        llm_breaker.trial_in_flight = False
+        if response is not None:
+            await response.close()
+    llm_breaker.record_success()
+
+
+async def ask_llm_ultra_fast(prompt, deadline=None):
     """Ultra-fast LLM call with optimized settings"""
-    response = openai.chat.completions.create(
+    async for content in stream_chat_completion(
+        deadline,
         model="gpt-4o-mini",  # Fastest model
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3,
-        stream=True,
         max_tokens=400
-    )
-    
-    for chunk in response:
-        if chunk.choices[0].delta.content is not None:
-            yield chunk.choices[0].delta.content
+    ):
+        yield content
 
 
 
 
-async def get_answer_fast(question):
+async def get_answer_fast(question, deadline=None):
     """Ultra-fast approach using search snippets only"""
     try:
+        deadline = deadline or new_deadline("serp")
         cache_key = get_cache_key(question)
-        
-        # Check search cache first
-        if cache_key in search_cache:
-            print("Using cached search results")
-            search_results = search_cache[cache_key]
-        else:
-            search_results = search_serpapi(question)
-            search_cache[cache_key] = search_results
-            print(f"Found {len(search_results)} search results")
+
+        # Search and follow-up generation only depend on the question
+        pipeline = Pipeline("serp")
+        pipeline.add("search", lambda: search_with_breaker(cache_key, search_serpapi, question, deadline),
+                     default=None)
+        pipeline.add("followups", lambda: generate_follow_up_questions(question),
+                     timeout=lambda: deadline.timeout(FOLLOWUP_TIMEOUT, reserve=LLM_RESERVE), default=[])
+        results = await pipeline.run()
+        note_stage_degradations(pipeline, deadline, {"followups": "no follow-up questions"})
+        search_results = results["search"]
+        follow_up_questions = results["followups"]
+
+        if search_results is None:
+            deadline.degrade("search", "ultra mode", pipeline.status("search"))
+            return await get_answer_ultra_fast(question, deadline, follow_up_questions)
 
         if not search_results:
             error_stream = create_error_stream("No search results found.")
             return error_stream, [], []
 
         # Prepare context from snippets (no scraping needed!)
-        context_parts = []
-        urls = []
-        for result in search_results:
-            if result['snippet']:
-                context_parts.append(f"Source: {result['title']}\n{result['snippet']}")
-                urls.append(result['link'])
+        context_parts, urls = snippet_context(search_results)
 
         if not context_parts:
             error_stream = create_error_stream("No relevant content found in search results.")
             return error_stream, urls, []
 
-        # Start follow-up generation in parallel
-        followup_task = asyncio.create_task(generate_follow_up_questions(question))
-        
         # Stream the answer using snippets as context
-        answer_stream = ask_llm_with_snippets(question, context_parts)
-        
-        # Wait for follow-up questions
-        follow_up_questions = await followup_task
+        answer_stream = ask_llm_with_snippets(question, context_parts, deadline)
         
         return answer_stream, urls, follow_up_questions
     except Exception as e:
         print(f"Error in fast answer: {e}")
-        error_stream = create_error_stream("An error occurred while processing your request.")
+        error_stream = create_error_stream("An error occurred while processing your request.", failed=True)
         return error_stream, [], []
 
 
-async def ask_llm_with_snippets(question, context_parts):
+async def get_answer_auto(question, deadline=None):
+    """Pick ultra, SERP or deep mode with a local classifier, escalating when
+    the cheaper mode's context looks insufficient"""
+    started_at = time.perf_counter()
+    predicted, confidence, _ = classify_question(question)
+    mode = predicted
+    escalations = []
+
+    if mode == "ultra" and confidence < MIN_CONFIDENCE:
+        escalations.append("low_confidence")
+        mode = escalate(mode)
+
+    if mode == "serp":
+        # Cached under the same key get_answer_fast uses, so this lookup is not repeated
+        try:
+            search_results = await search_with_breaker(
+                get_cache_key(question), search_serpapi, question, deadline
+            )
+        except Exception as e:
+            print(f"Error in auto routing search: {e!r}")
+            search_results = None
+        if search_results is None:
+            # Deep mode needs search too; answer from model knowledge instead
+            escalations.append("search_unavailable")
+            mode = "ultra"
+        elif not snippets_sufficient(question, search_results):
+            escalations.append("insufficient_snippets")
+            mode = escalate(mode)
+            # Deep mode reads its own search entry; seed it instead of searching again
+            deep_key = get_cache_key(question + "_deep")
+            if mode == "deep" and deep_key not in search_cache:
+                search_cache[deep_key] = search_results[:DEEP_SEARCH_RESULTS]
+
+    entry = routing_decision(question, predicted, confidence, mode, escalations, started_at)
+
+    handlers = {
+        "ultra": get_answer_ultra_fast,
+        "serp": get_answer_fast,
+        "deep": get_answer_deep,
+    }
+    deadline = deadline or new_deadline(mode)
+    answer_stream, urls, follow_up_questions = await handlers[mode](question, deadline)
+    if getattr(answer_stream, "failed", False):
+        log_routing_outcome(entry, "error", started_at, deadline.degradations)
+        return answer_stream, urls, follow_up_questions, mode
+    answer_stream = logged_answer_stream(answer_stream, entry, started_at, deadline)
+    return answer_stream, urls, follow_up_questions, mode
+
+
+async def logged_answer_stream(answer_stream, entry, started_at, deadline):
+    """Pass the answer through, then log the routed request's outcome and
+    its latency up to the end of the answer"""
+    outcome = "error"
+    try:
+        async for chunk in answer_stream:
+            yield chunk
+        outcome = "degraded" if deadline.degradations else "ok"
+    except (GeneratorExit, asyncio.CancelledError):
+        outcome = "disconnected"
+        raise
+    finally:
+        log_routing_outcome(entry, outcome, started_at, deadline.degradations)
+
+
+async def ask_llm_with_snippets(question, context_parts, deadline=None):
     """Stream answer using search snippets as context"""
     context = "\n\n---\n\n".join(context_parts)
     prompt = f"""Answer the question below using the following search results. Provide a comprehensive answer based on the available information:
@@ -141,61 +491,59 @@ Question: {question}
 
 Answer (be informative and cite sources when relevant):"""
 
-    response = openai.chat.completions.create(
+    async for content in stream_chat_completion(
+        deadline,
         model="gpt-4o-mini",  # Fast model
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3,
-        stream=True,
         max_tokens=300
-    )
-    
-    for chunk in response:
-        if chunk.choices[0].delta.content is not None:
-            yield chunk.choices[0].delta.content
+    ):
+        yield content
 
 
-async def get_answer_deep(question):
+async def get_answer_deep(question, deadline=None):
     """Deep dive approach using web scraping for comprehensive answers"""
     try:
+        deadline = deadline or new_deadline("deep")
         cache_key = get_cache_key(question + "_deep")
-        
-        # Check search cache first
-        if cache_key in search_cache:
-            print("Using cached deep search results")
-            urls = search_cache[cache_key]
-        else:
-            urls = search_serpapi_urls_only(question, max_results=3)  # Limit to 3 for deep dive
-            search_cache[cache_key] = urls
-            print(f"Found {len(urls)} URLs for deep scraping")
-
-        # Parallel knowledge base preparation with scraping
-        store = await prepare_knowledge_base_parallel(urls)
-        if not store:
-            error_stream = create_error_stream("No relevant content found after scraping.")
-            return error_stream, urls, []
-
-        # Get relevant chunks
-        question_embedding = get_embedding(question)
-        top_chunks = store.search(question_embedding, top_k=8)  # More chunks for deep analysis
+        prefetcher.mark_used(cache_key)
+        results = await run_retrieval_pipeline(
+            "deep", question, cache_key, deadline, max_results=DEEP_SEARCH_RESULTS, top_k=8  # More chunks for deep analysis
+        )
+        follow_up_questions = results["followups"]
+        schedule_prefetch(question, follow_up_questions)
+
+        if results["search"] is None:
+            deadline.degrade("search", "ultra mode", results["search_status"])
+            return await get_answer_ultra_fast(question, deadline, follow_up_questions)
+        urls = [result['link'] for result in results["search"]]
+
+        if not results["retrieve"]:
+            # Scraping was too slow or found nothing: answer from the snippets
+            context_parts, snippet_urls = snippet_context(results["search"])
+            if not context_parts:
+                error_stream = create_error_stream("No relevant content found after scraping.")
+                return error_stream, urls, []
+            status = results["knowledge_base_status"]
+            deadline.degrade("knowledge_base", "search snippets",
+                             status if status != "done" else "no usable scraped content")
+            answer_stream = ask_llm_with_snippets(question, context_parts, deadline)
+            return answer_stream, snippet_urls, follow_up_questions
+
+        top_chunks = results["retrieve"]
         print(f"Found {len(top_chunks)} relevant chunks from scraped content")
         
-        # Start follow-up generation in parallel
-        followup_task = asyncio.create_task(generate_follow_up_questions(question))
-        
         # Stream the comprehensive answer
-        answer_stream = ask_llm_deep(question, top_chunks)
-        
-        # Wait for follow-up questions
-        follow_up_questions = await followup_task
+        answer_stream = ask_llm_deep(question, top_chunks, deadline)
         
         return answer_stream, urls, follow_up_questions
     except Exception as e:
         print(f"Error in deep answer: {e}")
-        error_stream = create_error_stream("An error occurred while processing your deep dive request.")
+        error_stream = create_error_stream("An error occurred while processing your deep dive request.", failed=True)
         return error_stream, [], []
 
 
-async def ask_llm_deep(question, context_chunks):
+async def ask_llm_deep(question, context_chunks, deadline=None):
     """Deep analysis with more comprehensive prompting"""
     context = "\n\n---\n\n".join(context_chunks)
     prompt = f"""Provide a comprehensive and detailed answer to the question below using the following scraped web content. 
@@ -213,77 +561,198 @@ Question: {question}
 
 Comprehensive Answer:"""
 
-    response = openai.chat.completions.create(
+    async for content in stream_chat_completion(
+        deadline,
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3,
-        stream=True,
         max_tokens=500  # More tokens for comprehensive answers
-    )
-    
-    for chunk in response:
-        if chunk.choices[0].delta.content is not None:
-            yield chunk.choices[0].delta.content
+    ):
+        yield content
+
+
+async def run_retrieval_pipeline(name, question, cache_key, deadline, max_results, top_k):
+    """Search -> scrape/index -> retrieve, with question embedding and
+    follow-ups started at t=0 alongside them. Every stage is sized to the
+    request deadline; search and scraping fall back to None if they fail."""
+
+    async def build(search):
+        if not search:
+            return None
+        urls = [result['link'] for result in search]
+        # Short on budget: scrape proportionally fewer pages
+        remaining = deadline.remaining()
+        if remaining < DEEP_FULL_SCRAPE_BUDGET and len(urls) > 1:
+            keep = max(1, int(len(urls) * remaining / DEEP_FULL_SCRAPE_BUDGET))
+            if keep < len(urls):
+                deadline.degrade("scrape", f"{keep} of {len(urls)} pages", "low latency budget")
+                urls = urls[:keep]
+        urls = scrapeable_urls(urls, deadline)
+        if not urls:
+            return None
+        return await prepare_knowledge_base_parallel(urls)
+
+    async def retrieve(knowledge_base, question_embedding):
+        if not knowledge_base:
+            return []
+        # BM25 fused with vector search; lexical only if the embedding is missing
+        return knowledge_base.search(question, question_embedding, top_k=top_k)
+
+    pipeline = Pipeline(name)
+    pipeline.add("search", lambda: search_with_breaker(
+        cache_key, search_serpapi, question, deadline, max_results=max_results
+    ), default=None)
+    pipeline.add("knowledge_base", build, deps=["search"],
+                 timeout=lambda: deadline.timeout(KNOWLEDGE_BASE_TIMEOUT, reserve=LLM_RESERVE),
+                 default=None)
+    # A healthy embedding call may well take longer than this cap; only errors count
+    pipeline.add("question_embedding", lambda: guarded(
+        embedding_breaker, lambda: asyncio.to_thread(get_embedding, question),
+        deadline, QUERY_EMBEDDING_TIMEOUT, count_timeout=False
+    ), default=None)
+    pipeline.add("followups", lambda: generate_follow_up_questions(question),
+                 timeout=lambda: deadline.timeout(FOLLOWUP_TIMEOUT, reserve=LLM_RESERVE), default=[])
+    pipeline.add("retrieve", retrieve, deps=["knowledge_base", "question_embedding"])
+    results = await pipeline.run()
+
+    note_stage_degradations(pipeline, deadline, {
+        "question_embedding": "lexical retrieval",
+        "followups": "no follow-up questions",
+    })
+    results["search_status"] = pipeline.status("search")
+    results["knowledge_base_status"] = pipeline.status("knowledge_base")
+    return results
 
 
 async def prepare_knowledge_base_parallel(urls):
     """Optimized parallel knowledge base preparation"""
-    cache_key = "_".join(sorted(urls))
+    cache_key = get_knowledge_base_key(urls)
     
     # Check if we have cached knowledge base
     if cache_key in knowledge_base_cache:
         print("Using cached knowledge base")
         return knowledge_base_cache[cache_key]
-    
-    cache = load_cache()
-    all_chunks = []
-    all_embeddings = []
+
+    # Another question over the same URLs may already be building it
+    task = inflight.get(("knowledge_base", cache_key))
+    if task is None:
+        task = track_inflight(
+            ("knowledge_base", cache_key), asyncio.ensure_future(build_knowledge_base(urls))
+        )
+    return await asyncio.shield(task)
+
+
+async def build_knowledge_base(urls):
+    cache_key = get_knowledge_base_key(urls)
+    cache = get_embedding_cache()
+    store = HybridStore()
 
     # Parallel scraping - this is the key optimization!
-    print(f"Scraping {len(urls)} URLs in parallel...")
-    scraped_texts = await scrape_urls_parallel(urls)
-    
-    # Process all scraped content
-    for text in scraped_texts:
-        if not text:
-            continue
-        chunks = chunk_text(text)
-        for chunk in chunks:
-            embedding = get_or_embed(chunk, get_embedding, cache)
-            all_chunks.append(chunk)
-            all_embeddings.append(embedding)
+    scraped_texts = await fetch_pages(urls)
     
-    save_cache(cache)
+    # Drop syndicated copies, recurring boilerplate and near-duplicate chunks
+    # before anything is embedded (pure-Python fingerprinting, so off the event loop)
+    ingest_stats = Counter()
+    chunks = await asyncio.to_thread(
+        ingest_pages,
+        [text for text in scraped_texts if text],
+        [url for url, text in zip(urls, scraped_texts) if text], ingest_stats, cache
+    )
 
-    if all_embeddings:
-        dim = len(all_embeddings[0])
-        store = FAISSStore(dim)
-        store.add(all_embeddings, all_chunks)
-        
-        # Cache the knowledge base
-        knowledge_base_cache[cache_key] = store
-        print(f"Created knowledge base with {len(all_chunks)} chunks")
-        return store
-    else:
+    # Index chunks lexically as they are produced
+    store.add_texts([chunk for chunk, _ in chunks])
+
+    if not store.texts:
+        print_ingest_stats(ingest_stats)
         return None
 
+    # Vector index is optional: if embedding fails the store stays lexical-only
+    if not embedding_breaker.allow():
+        print("Embedding circuit breaker open, knowledge base is lexical-only")
+        print_ingest_stats(ingest_stats)
+        return store
+
+    task = asyncio.ensure_future(add_vector_index(store, chunks, cache, ingest_stats, cache_key))
+    try:
+        await asyncio.wait_for(asyncio.shield(task), CHUNK_EMBEDDING_TIMEOUT)
+    except asyncio.TimeoutError:
+        print("Chunk embedding is slow, knowledge base is lexical-only until its vector index is ready")
+        # Cached now so other questions share it and pick up the vectors once added
+        knowledge_base_cache[cache_key] = store
+    print(f"Created knowledge base with {len(store.texts)} chunks")
+    return store
+
+
+def ingest_pages(texts, urls, stats, cache):
+    """Clean and chunk scraped pages; returns (chunk, similar_earlier_chunk) pairs"""
+    with ingest_lock:
+        pages = ingest_filter.clean_pages(texts, urls, stats)
+        all_chunks = [chunk for text in pages for chunk in page_chunks(text)]
+        return ingest_filter.dedupe_chunks(
+            all_chunks, stats, is_cached=lambda chunk: embedding_key(chunk) in cache
+        )
+
+
+def page_chunks(text):
+    # Paragraph-aligned, so text repeated across requests reuses cached embeddings
+    return ingest_filter.chunk_page(text, split_long=chunk_text)
 
-async def ask_llm(question, context_chunks):
+
+async def add_vector_index(store, chunks, cache, stats, cache_key):
+    """Embed the chunks and attach a vector index to `store`, then cache it.
+    Lexical-only stores are dropped from the cache so the next question retries."""
+    try:
+        all_embeddings = await asyncio.to_thread(embed_chunks, chunks, cache, stats)
+        vector_store = FAISSStore(len(all_embeddings[0]))
+        vector_store.add(all_embeddings, store.texts)
+        store.vector_store = vector_store
+        embedding_breaker.record_success()
+        knowledge_base_cache[cache_key] = store
+    except Exception as e:
+        embedding_breaker.record_failure()
+        knowledge_base_cache.pop(cache_key, None)
+        print(f"Chunk embedding failed, knowledge base is lexical-only: {e!r}")
+    finally:
+        save_embedding_cache_soon()
+        print_ingest_stats(stats)
+
+
+def embed_chunks(chunks, cache, stats):
+    """Embed (chunk, similar_earlier_chunk) pairs, reusing the earlier chunk's
+    embedding for near-duplicates seen in previous requests"""
+    embeddings = []
+    for chunk, similar in chunks:
+        key = embedding_key(chunk)
+        if key not in cache and similar is not None and embedding_key(similar) in cache:
+            cache[key] = cache[embedding_key(similar)]
+            stats["embedding_calls_saved"] += 1
+            stats["tokens_saved"] += count_tokens(chunk)
+        embeddings.append(get_or_embed(chunk, get_embedding, cache))
+    return embeddings
+
+
+def print_ingest_stats(stats):
+    print(
+        f"Ingest: dropped {stats['pages_dropped']}/{stats['pages_in']} pages, "
+        f"{stats['boilerplate_paragraphs']} boilerplate and {stats['duplicate_paragraphs']} repeated paragraphs, "
+        f"{stats['chunks_dropped']}/{stats['chunks_in']} chunks; saved "
+        f"{stats['embedding_calls_saved']} embedding calls (~{stats['tokens_saved']} tokens)"
+    )
+
+
+async def ask_llm(question, context_chunks, deadline=None):
     """Simplified streaming LLM call"""
     context = "\n\n---\n\n".join(context_chunks)
     prompt = f"""Answer the question below using the following context and keep your answer concise and to the point should be in 100 words:\n\n{context}\n\nQuestion: {question}\nAnswer:
     """
 
-    response = openai.chat.completions.create(
+    async for content in stream_chat_completion(
+        deadline,
         model="gpt-4o-mini",  # Faster model
         messages=[{"role": "user", "content": prompt}],
-        temperature=0.2,
-        stream=True
-    )
-    
-    for chunk in response:
-        if chunk.choices[0].delta.content is not None:
-            yield chunk.choices[0].delta.content
+        temperature=0.2
+    ):
+        yield content
 
 
 async def generate_follow_up_questions(question, answer=None):
@@ -296,12 +765,12 @@ async def generate_follow_up_questions(question, answer=None):
     Follow-up questions:"""
 
     try:
-        response = openai.chat.completions.create(
+        response = await call_with_breaker(llm_breaker, lambda: create_chat_completion(
             model="gpt-4o-mini",  # Faster model
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=150
-        )
+        ))
         
         questions = response.choices[0].message.content.strip().split('\n')
         questions = [q.strip().replace('- ', '').replace('• ', '').replace('1. ', '').replace('2. ', '').replace('3. ', '') 
@@ -312,46 +781,115 @@ async def generate_follow_up_questions(question, answer=None):
         return []
 
 
-async def create_error_stream(error_message):
-    """Create an async generator for error messages"""
-    yield error_message
+def needs_refresh(cache, key):
+    return cache.expires_in(key) < PREFETCH_REFRESH_WINDOW
+
+
+def chunk_keys(pages):
+    return {embedding_key(chunk) for text in pages if text for chunk in page_chunks(text)}
+
+
+async def prefetch_question(question, budget):
+    """Warm the deep-mode search, page and knowledge base caches for a likely
+    next question, refreshing entries that are about to expire. Never calls the
+    answer LLM. Searches, page fetches and chunk embeddings are all charged to
+    `budget`. Returns True if anything was fetched."""
+    cache_key = get_cache_key(question + "_deep")
+    fetched = False
+    if needs_refresh(search_cache, cache_key):
+        if not budget.try_spend(1):
+            return False
+        search_cache.pop(cache_key)
+        fetched = True
+    search_results = await search_with_breaker(cache_key, search_serpapi, question, max_results=DEEP_SEARCH_RESULTS)
+    urls = scrapeable_urls([result['link'] for result in search_results])
+    knowledge_base_key = get_knowledge_base_key(urls)
+    if not urls or not needs_refresh(knowledge_base_cache, knowledge_base_key):
+        return fetched
+
+    to_fetch = [url for url in urls if needs_refresh(page_cache, url)]
+    if to_fetch:
+        if not budget.try_spend(len(to_fetch)):
+            return fetched
+        for url in to_fetch:
+            page_cache.pop(url)
+        fetched = True
+    pages = await fetch_pages(urls)
+
+    # Each uncached chunk is one embedding call; leave the pages cached and
+    # skip the index if the budget can't cover them (an upper bound, as the
+    # ingest filter drops some chunks before embedding)
+    cache = get_embedding_cache()
+    uncached = len(await asyncio.to_thread(chunk_keys, pages) - cache.keys())
+    if uncached and not budget.try_spend(uncached):
+        return fetched
+    knowledge_base_cache.pop(knowledge_base_key)
+    await prepare_knowledge_base_parallel(urls)
+    return True
+
+
+prefetcher = PrefetchWorker(
+    prefetch_question,
+    key_fn=lambda question: get_cache_key(question + "_deep"),
+    budget=CallBudget(max_calls=PREFETCH_CALLS_PER_MINUTE, window=60.0),
+)
+
+
+def schedule_prefetch(question, follow_up_questions):
+    """Record the question for trending and queue its follow-ups for warming.
+
+    Only called from the modes that read the knowledge base cache (deep and
+    default); ultra and SERP follow-ups would not use what gets warmed.
+    """
+    prefetcher.record_question(question)
+    for follow_up in follow_up_questions:
+        prefetcher.submit(follow_up)
+
+
+class ErrorStream:
+    """Answer stream that yields a single message. `failed` is set when the
+    pipeline errored, as opposed to finding nothing to answer from."""
+
+    def __init__(self, message, failed=False):
+        self.message = message
+        self.failed = failed
+
+    async def __aiter__(self):
+        yield self.message
+
 
-async def get_answer(question):
+def create_error_stream(error_message, failed=False):
+    """Create an async stream for error messages"""
+    return ErrorStream(error_message, failed)
+
+async def get_answer(question, deadline=None):
     """Optimized main function with caching and parallel processing"""
     try:
+        deadline = deadline or new_deadline("deep")
         cache_key = get_cache_key(question)
-        
-        # Check search cache first
-        if cache_key in search_cache:
-            print("Using cached search results")
-            urls = search_cache[cache_key]
-        else:
-            urls = search_serpapi_urls_only(question)
-            search_cache[cache_key] = urls
-            print(f"Found {len(urls)} relevant URLs")
-
-        # Parallel knowledge base preparation
-        store = await prepare_knowledge_base_parallel(urls)
-        if not store:
+        results = await run_retrieval_pipeline(
+            "default", question, cache_key, deadline, max_results=3, top_k=5  # Increased for better context
+        )
+        follow_up_questions = results["followups"]
+        schedule_prefetch(question, follow_up_questions)
+
+        if results["search"] is None:
+            deadline.degrade("search", "ultra mode", results["search_status"])
+            return await get_answer_ultra_fast(question, deadline, follow_up_questions)
+        urls = [result['link'] for result in results["search"]]
+
+        if not results["retrieve"]:
             error_stream = create_error_stream("No relevant content found.")
             return error_stream, urls, []
 
-        # Get relevant chunks
-        question_embedding = get_embedding(question)
-        top_chunks = store.search(question_embedding, top_k=5)  # Increased for better context
+        top_chunks = results["retrieve"]
         print(f"Found {len(top_chunks)} relevant chunks")
         
-        # Start follow-up generation in parallel (fire and forget)
-        followup_task = asyncio.create_task(generate_follow_up_questions(question))
-        
         # Stream the answer
-        answer_stream = ask_llm(question, top_chunks)
-        
-        # Wait for follow-up questions
-        follow_up_questions = await followup_task
+        answer_stream = ask_llm(question, top_chunks, deadline)
         
         return answer_stream, urls, follow_up_questions
     except Exception as e:
         print(f"Error: {e}")
-        error_stream = create_error_stream("An error occurred while processing your request.")
+        error_stream = create_error_stream("An error occurred while processing your request.", failed=True)
         return error_stream, [], []
\ No newline at end of file
@@ -0,0 +1,212 @@
+import hashlib
+from collections import OrderedDict
+from urllib.parse import urlparse
+from .hybrid_store import tokenize
+
+SIMHASH_BITS = 64
+BANDS = 4  # 4 x 16-bit bands: any pair within 3 bits shares at least one band exactly
+NEAR_DUPLICATE_DISTANCE = 3
+# A short paragraph seen on this many distinct pages of one site (in any request)
+# is that site's template. Paragraphs shared across sites are syndicated or quoted
+# content, as are longer ones, and are kept once per request.
+BOILERPLATE_MIN_PAGES = 3
+BOILERPLATE_MAX_WORDS = 25
+MIN_PARAGRAPH_WORDS = 3
+# Chunks are runs of whole paragraphs. A chunk may end after a paragraph whose
+# fingerprint has these low bits clear (about 1 in 4), so boundaries follow the
+# content and line up again after a differing intro: the same paragraphs give
+# the same chunks on any page, in any request, and hit the embedding cache.
+# No minimum size: one would make boundaries depend on what came before again.
+CHUNK_BOUNDARY_MASK = 3
+CHUNK_MAX_TOKENS = 500
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+def simhash(text, shingle_size=3):
+    """64-bit SimHash over word shingles; near-identical texts differ in few bits"""
+    tokens = tokenize(text)
+    if len(tokens) <= shingle_size:
+        shingles = [" ".join(tokens)] if tokens else []
+    else:
+        shingles = [" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = _hash64(shingle)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def estimate_tokens(text):
+    return len(text.split()) * 4 // 3
+
+
+class SimHashIndex:
+    """Banded lookup of near-duplicate fingerprints, oldest entries evicted first"""
+
+    def __init__(self, max_entries=50000, distance=NEAR_DUPLICATE_DISTANCE):
+        self.max_entries = max_entries
+        self.distance = distance
+        self.entries = OrderedDict()  # fingerprint -> payload
+        self.bands = {}  # (band, value) -> set of fingerprints
+        self.band_bits = SIMHASH_BITS // BANDS
+
+    def _band_keys(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(i, (fingerprint >> (i * self.band_bits)) & mask) for i in range(BANDS)]
+
+    def find(self, fingerprint):
+        for key in self._band_keys(fingerprint):
+            for candidate in self.bands.get(key, ()):
+                if hamming_distance(candidate, fingerprint) <= self.distance:
+                    return self.entries[candidate]
+        return None
+
+    def add(self, fingerprint, payload):
+        if fingerprint in self.entries:
+            return
+        self.entries[fingerprint] = payload
+        for key in self._band_keys(fingerprint):
+            self.bands.setdefault(key, set()).add(fingerprint)
+        if len(self.entries) > self.max_entries:
+            oldest, _ = self.entries.popitem(last=False)
+            for key in self._band_keys(oldest):
+                self.bands[key].discard(oldest)
+
+
+class IngestFilter:
+    """Drops near-duplicate pages and chunks and recurring boilerplate before embedding.
+
+    Boilerplate paragraphs and chunk fingerprints are remembered across
+    requests; near-duplicate pages and chunks are dropped within a request
+    (across requests, a near-duplicate chunk reuses the earlier chunk's
+    embedding instead). chunk_page cuts chunks at content-defined paragraph
+    boundaries, so text repeated in a later request yields the same chunks and
+    their cached embeddings. Not thread-safe: callers serialize access.
+    """
+
+    def __init__(self, count_tokens=estimate_tokens, max_paragraphs=50000):
+        self.count_tokens = count_tokens
+        self.max_paragraphs = max_paragraphs
+        self.paragraph_pages = OrderedDict()  # paragraph hash -> {site: set of page ids}
+        # Canonical page ids, so a re-scraped page with a changed timestamp
+        # does not count as another page sharing all of its paragraphs
+        self.page_ids = SimHashIndex()
+        self.chunk_index = SimHashIndex()
+
+    def _paragraph_key(self, paragraph):
+        return _hash64(" ".join(tokenize(paragraph)))
+
+    def _is_boilerplate(self, key):
+        sites = self.paragraph_pages.get(key, {})
+        return any(len(page_ids) >= BOILERPLATE_MIN_PAGES for page_ids in sites.values())
+
+    def clean_pages(self, texts, urls, stats):
+        """Return page texts with near-duplicate pages and boilerplate removed.
+
+        `urls` are the pages' addresses, used to tell a site's template
+        apart from content other sites share.
+        """
+        page_index = SimHashIndex()
+        pages = []
+        for text, url in zip(texts, urls):
+            fingerprint = simhash(text)
+            if page_index.find(fingerprint) is not None:
+                stats["pages_dropped"] += 1
+                stats["tokens_saved"] += self.count_tokens(text)
+                continue
+            page_index.add(fingerprint, True)
+            page_id = self.page_ids.find(fingerprint)
+            if page_id is None:
+                page_id = fingerprint
+                self.page_ids.add(fingerprint, page_id)
+
+            paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
+            for paragraph in paragraphs:
+                key = self._paragraph_key(paragraph)
+                sites = self.paragraph_pages.setdefault(key, {})
+                sites.setdefault(urlparse(url).netloc, set()).add(page_id)
+                self.paragraph_pages.move_to_end(key)
+            pages.append(paragraphs)
+
+        while len(self.paragraph_pages) > self.max_paragraphs:
+            self.paragraph_pages.popitem(last=False)
+
+        # Second pass so boilerplate on later pages is also removed from earlier ones
+        cleaned = []
+        emitted = set()
+        for paragraphs in pages:
+            kept = []
+            for paragraph in paragraphs:
+                key = self._paragraph_key(paragraph)
+                words = len(paragraph.split())
+                if self._is_boilerplate(key) and MIN_PARAGRAPH_WORDS <= words <= BOILERPLATE_MAX_WORDS:
+                    stats["boilerplate_paragraphs"] += 1
+                    stats["tokens_saved"] += self.count_tokens(paragraph)
+                elif key in emitted:
+                    stats["duplicate_paragraphs"] += 1
+                    stats["tokens_saved"] += self.count_tokens(paragraph)
+                else:
+                    emitted.add(key)
+                    kept.append(paragraph)
+            if kept:
+                cleaned.append("\n".join(kept))
+        stats["pages_in"] += len(texts)
+        return cleaned
+
+    def chunk_page(self, text, split_long=None):
+        """Split a cleaned page into paragraph-aligned chunks with content-defined
+        boundaries. Paragraphs over CHUNK_MAX_TOKENS are passed to `split_long`."""
+        chunks, current, size = [], [], 0
+
+        def flush():
+            nonlocal current, size
+            if current:
+                chunks.append("\n".join(current))
+            current, size = [], 0
+
+        for paragraph in (p.strip() for p in text.split("\n")):
+            if not paragraph:
+                continue
+            tokens = self.count_tokens(paragraph)
+            if tokens > CHUNK_MAX_TOKENS:
+                flush()
+                chunks.extend(split_long(paragraph) if split_long else [paragraph])
+                continue
+            if size + tokens > CHUNK_MAX_TOKENS:
+                flush()
+            current.append(paragraph)
+            size += tokens
+            if self._paragraph_key(paragraph) & CHUNK_BOUNDARY_MASK == 0:
+                flush()
+        flush()
+        return chunks
+
+    def dedupe_chunks(self, chunks, stats, is_cached=lambda chunk: False):
+        """Return (chunk, similar_earlier_chunk_or_None) pairs, near-duplicates dropped"""
+        request_index = SimHashIndex()
+        kept = []
+        for chunk in chunks:
+            fingerprint = simhash(chunk)
+            if request_index.find(fingerprint) is not None:
+                stats["chunks_dropped"] += 1
+                stats["tokens_saved"] += self.count_tokens(chunk)
+                if not is_cached(chunk):
+                    stats["embedding_calls_saved"] += 1
+                continue
+            request_index.add(fingerprint, chunk)
+            similar = self.chunk_index.find(fingerprint)
+            if similar is None:
+                self.chunk_index.add(fingerprint, chunk)
+            kept.append((chunk, similar))
+        stats["chunks_in"] += len(chunks)
+        return kept
+
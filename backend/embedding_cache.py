@@ -13,8 +13,11 @@ def save_cache(cache):
     with open(CACHE_FILE, "w") as f:
         json.dump(cache, f)
 
+def cache_key(text):
+    return text.strip().replace("\n", " ")[:1000]  # truncate key to avoid huge cache keys
+
 def get_or_embed(text, get_embedding_fn, cache):
-    key = text.strip().replace("\n", " ")[:1000]  # truncate key to avoid huge cache keys
+    key = cache_key(text)
     if key in cache:
         print(f"Cache hit")
         return cache[key]
@@ -0,0 +1,62 @@
+import math
+import time
+from collections import OrderedDict
+
+
+class ExpiringCache:
+    """Dict-like cache whose entries expire `ttl` seconds after they are stored.
+
+    With `max_entries`, the least recently used entry is evicted first.
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at or None, value)
+
+    def _live(self, key):
+        item = self.entries.get(key)
+        if item is None:
+            return None
+        if item[0] is not None and item[0] <= time.monotonic():
+            del self.entries[key]
+            return None
+        return item
+
+    def __contains__(self, key):
+        return self._live(key) is not None
+
+    def __getitem__(self, key):
+        item = self._live(key)
+        if item is None:
+            raise KeyError(key)
+        self.entries.move_to_end(key)
+        return item[1]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        if self.max_entries is not None:
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self.entries.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def expires_in(self, key):
+        """Seconds until `key` expires: 0 if it is missing, inf if it never expires"""
+        item = self._live(key)
+        if item is None:
+            return 0.0
+        return math.inf if item[0] is None else item[0] - time.monotonic()
@@ -11,8 +11,11 @@ class FAISSStore:
         self.texts.extend(texts)
 
     def search(self, query_vector, top_k=5):
+        return [self.texts[i] for i in self.search_ids(query_vector, top_k)]
+
+    def search_ids(self, query_vector, top_k=5):
         D, I = self.index.search(np.array([query_vector]).astype("float32"), top_k)
-        return [self.texts[i] for i in I[0] if i < len(self.texts)]
+        return [int(i) for i in I[0] if 0 <= i < len(self.texts)]
 
     def save(self, path):
         faiss.write_index(self.index, path)
@@ -0,0 +1,228 @@
+# backend/fault_injection.py
+# Run the answer pipelines against local stand-ins for search, sites, embeddings
+# and the LLM that inject latency and failures, and print which degradations
+# and circuit breakers kick in:  python -m backend.fault_injection
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from urllib.parse import urlparse
+from backend import corelogic
+from backend.resilience import breakers
+
+
+class Faults:
+    def __init__(self):
+        self.search_delay = 0.0
+        self.search_error = False
+        self.site_delay = 0.0
+        self.failing_sites = set()
+        self.empty_sites = set()  # fetch fine, but no article text extracted
+        self.embedding_error = False
+        self.embedding_delay = 0.0
+        self.llm_token_delay = 0.0
+        self.calls = {"search": 0, "scrape": 0, "embedding": 0, "llm": 0}
+
+
+faults = Faults()
+
+PAGE = ("Solid state batteries replace the liquid electrolyte with a solid one. "
+        "They promise higher energy density and better safety. ") * 40
+
+
+def stand_in_search(query, max_results=5):
+    faults.calls["search"] += 1
+    time.sleep(faults.search_delay)
+    if faults.search_error:
+        raise ConnectionError("search upstream returned 503")
+    sites = ["news.example", "wiki.example", "blog.example"]
+    return [
+        {"title": f"{query} on {site}", "snippet": f"{site} says: {query} explained briefly.",
+         "link": f"https://{site}/article", "source": site}
+        for site in sites[:max_results]
+    ]
+
+
+async def stand_in_scrape(urls, max_concurrent=3):
+    faults.calls["scrape"] += len(urls)
+    await asyncio.sleep(faults.site_delay)
+    pages = {}
+    for url in urls:
+        site = urlparse(url).netloc
+        pages[url] = None if site in faults.failing_sites else "" if site in faults.empty_sites else f"{url}\n{PAGE}"
+    return pages
+
+
+def stand_in_embedding(text, model="text-embedding-3-small"):
+    faults.calls["embedding"] += 1
+    time.sleep(faults.embedding_delay)
+    if faults.embedding_error:
+        raise ConnectionError("embeddings upstream timed out")
+    return [float(len(text) % 13), float(text.count("e") % 7), 1.0]
+
+
+class StandInStream:
+    def __init__(self, words):
+        self.words = iter(words)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        word = next(self.words, None)
+        if word is None:
+            raise StopAsyncIteration
+        await asyncio.sleep(faults.llm_token_delay)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+
+    async def close(self):
+        pass
+
+
+async def stand_in_chat_completion(stream=False, **kwargs):
+    faults.calls["llm"] += 1
+    if not stream:
+        return SimpleNamespace(choices=[SimpleNamespace(
+            message=SimpleNamespace(content="Follow-up one\nFollow-up two\nFollow-up three"))])
+    return StandInStream("Solid state batteries use a solid electrolyte instead of a liquid .".split())
+
+
+def reset():
+    global faults
+    faults = Faults()
+    corelogic.search_cache.clear()
+    corelogic.knowledge_base_cache.clear()
+    corelogic.page_cache.clear()
+    corelogic.embedding_cache = {}
+    for name in list(breakers):
+        if name.startswith("site:"):
+            del breakers[name]
+        else:
+            breakers[name].record_success()
+
+
+async def ask(answer_fn, question, mode, budget):
+    deadline = corelogic.new_deadline(mode, budget)
+    start = time.perf_counter()
+    answer_stream, urls, follow_ups = await answer_fn(question, deadline)
+    first_token = None
+    answer = []
+    async for chunk in answer_stream:
+        if first_token is None:
+            first_token = time.perf_counter() - start
+        answer.append(chunk)
+    total = time.perf_counter() - start
+    return {
+        "first_token_s": round(first_token or total, 2),
+        "total_s": round(total, 2),
+        "urls": len(urls),
+        "follow_ups": len(follow_ups),
+        "answer": "".join(answer)[:60],
+        "degradations": [f"{d['stage']} -> {d['fallback']} ({d['reason']})" for d in deadline.degradations],
+    }
+
+
+def report(name, result):
+    print(f"\n== {name}")
+    for key, value in result.items():
+        print(f"   {key}: {value}")
+    print(f"   calls: {faults.calls}")
+    print(f"   breakers: { {n: b.state for n, b in breakers.items() if b.state != 'closed'} }")
+
+
+async def main():
+    question = "How do solid state batteries work?"
+    deep, fast = corelogic.get_answer_deep, corelogic.get_answer_fast
+
+    reset()
+    report("healthy deep, default budget", await ask(deep, question, "deep", None))
+
+    reset()
+    faults.search_delay = 5
+    report("slow search, 4s budget: serp falls back to ultra", await ask(fast, question, "serp", 4))
+    faults.search_delay = 0
+    report("then ultra for the same question: follow-ups were not cached empty",
+           await ask(corelogic.get_answer_ultra_fast, question, "ultra", None))
+
+    reset()
+    faults.site_delay = 6
+    report("slow sites, 5s budget: deep answers from snippets", await ask(deep, question, "deep", 5))
+
+    reset()
+    report("8s budget: deep scrapes fewer pages", await ask(deep, question, "deep", 8))
+
+    reset()
+    faults.embedding_error = True
+    for _ in range(5):
+        corelogic.knowledge_base_cache.clear()
+        result = await ask(deep, question, "deep", 10)
+    report("embeddings down x5: lexical retrieval, breaker opens", result)
+
+    reset()
+    faults.embedding_delay = 3
+    result = await ask(deep, question, "deep", None)
+    kb = corelogic.knowledge_base_cache.get(corelogic.get_knowledge_base_key(
+        [r["link"] for r in corelogic.search_cache[corelogic.get_cache_key(question + "_deep")]]))
+    result["vector_index_when_answered"] = kb is not None and kb.vector_store is not None
+    await asyncio.sleep(faults.embedding_delay * 3)
+    result["vector_index_later"] = kb is not None and kb.vector_store is not None
+    report("slow embeddings: answer from a lexical-only knowledge base, vectors added later", result)
+    for _ in range(4):
+        result = await ask(deep, question, "deep", None)
+    report("slow embeddings x5: question embedding times out, breaker stays closed", result)
+
+    reset()
+    faults.llm_token_delay = 0.4
+    report("slow LLM, 4s budget: answer truncated", await ask(fast, question, "serp", 4))
+
+    reset()
+    faults.search_error = True
+    for _ in range(5):
+        corelogic.search_cache.clear()
+        await ask(fast, question, "serp", 10)
+    calls_before = faults.calls["search"]
+    result = await ask(fast, question, "serp", 10)
+    result["search_calls_while_open"] = faults.calls["search"] - calls_before
+    report("search failing x5: breaker opens, no more search calls", result)
+
+    reset()
+    faults.failing_sites = {"blog.example"}
+    for _ in range(2):
+        corelogic.knowledge_base_cache.clear()
+        corelogic.search_cache.clear()
+        await ask(deep, question, "deep", 20)
+    corelogic.search_cache.clear()
+    report("one site failing x2: its breaker opens and it is skipped",
+           await ask(deep, question + " again", "deep", 20))
+
+    reset()
+    faults.empty_sites = {"blog.example"}
+    for n in range(3):
+        corelogic.knowledge_base_cache.clear()
+        corelogic.search_cache.clear()
+        result = await ask(deep, f"{question} {n}", "deep", 20)
+    report("one site with no article text x3: its breaker stays closed", result)
+
+    reset()
+    llm = breakers["llm"]
+    for _ in range(llm.failure_threshold):
+        llm.record_failure()
+    llm.opened_at -= llm.reset_timeout  # half-open: the next answer is the trial
+    answer_stream, _, _ = await fast(question, corelogic.new_deadline("serp"))
+    await answer_stream.__anext__()
+    await answer_stream.aclose()  # client disconnects mid-answer
+    result = await ask(fast, question, "serp", 10)
+    result["llm_trial_in_flight"] = llm.trial_in_flight
+    report("client disconnects during the half-open trial: next answer still goes through", result)
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())  # keep the embedding cache file out of the repo
+    corelogic.search_serpapi = stand_in_search
+    corelogic.scrape_urls_by_url = stand_in_scrape
+    corelogic.get_embedding = stand_in_embedding
+    corelogic.create_chat_completion = stand_in_chat_completion
+    corelogic.LLM_RESERVE = 1.0
+    corelogic.CHUNK_EMBEDDING_TIMEOUT = 2.0
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+# Keeps codes, versions and numbers ("gpt-4o", "3.11", "rfc7231") as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._-][a-z0-9]+)*")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """In-process inverted index, updated incrementally as chunks arrive"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(doc_id, term_freq)]
+        self.doc_lengths = []
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, texts):
+        for text in texts:
+            doc_id = len(self.doc_lengths)
+            terms = tokenize(text)
+            for term, freq in Counter(terms).items():
+                self.postings[term].append((doc_id, freq))
+            self.doc_lengths.append(len(terms))
+            self.total_length += len(terms)
+
+    def search(self, query, top_k=5):
+        """Return doc ids ranked by BM25 score"""
+        if not self.doc_lengths:
+            return []
+        n_docs = len(self.doc_lengths)
+        avg_length = self.total_length / n_docs or 1
+        scores = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, freq in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return ranked[:top_k]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Merge several ranked id lists; k dampens the weight of top positions"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridStore:
+    """BM25 over every chunk, plus FAISS when chunk embeddings were available"""
+
+    def __init__(self, vector_store=None):
+        self.vector_store = vector_store
+        self.lexical = BM25Index()
+        self.texts = []
+
+    def add_texts(self, texts):
+        self.lexical.add(texts)
+        self.texts.extend(texts)
+
+    def search(self, query, query_vector=None, top_k=5, candidates=20):
+        """Fuse lexical and vector rankings; lexical only when there is no vector"""
+        lexical_ids = self.lexical.search(query, top_k=candidates)
+        if query_vector is None or self.vector_store is None:
+            return [self.texts[i] for i in lexical_ids[:top_k]]
+
+        vector_ids = self.vector_store.search_ids(query_vector, top_k=candidates)
+        fused = reciprocal_rank_fusion([lexical_ids, vector_ids])
+        return [self.texts[i] for i in fused[:top_k]]
@@ -1,17 +1,30 @@
-from fastapi import FastAPI, Request
-from pydantic import BaseModel
+from fastapi import FastAPI, Request, HTTPException
+from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from .corelogic import get_answer_fast, get_answer_deep, get_answer_ultra_fast
+from .corelogic import (
+    get_answer_fast, get_answer_deep, get_answer_ultra_fast, get_answer_auto, prefetcher, new_deadline,
+    flush_embedding_cache
+)
+from .resilience import breaker_report
 from .models.user import User
 from .pydanticschemas.user import UserResponse, UserCreate
 from .routers import users
+from .batch import BATCH_MAX_CONCURRENCY, create_job, iter_results, jobs
+from typing import List, Optional
 from .dbclient import Base, engine
 
+import asyncio
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 load_dotenv()
 
+# Worker threads for blocking calls (search, embeddings, page extraction); they
+# mostly wait on the network, so the default of cpu + 4 is far too few
+BLOCKING_IO_THREADS = int(os.getenv("BLOCKING_IO_THREADS", "32"))
+
 app = FastAPI()
 
 
@@ -27,29 +40,67 @@ app.include_router(users.router)
 
 class Query(BaseModel):
     question: str
+    budget: Optional[float] = Field(None, gt=0)  # latency budget in seconds; defaults per mode
 
 class DeepQuery(BaseModel):
     question: str
     mode: str = "deep"  # "fast" or "deep"
 
+class BatchQuery(BaseModel):
+    questions: List[str]
+    mode: str = "deep"  # "ultra", "serp", "deep" or "auto"
+    concurrency: int = BATCH_MAX_CONCURRENCY
+    budget: Optional[float] = Field(None, gt=0)  # per-question latency budget; defaults per mode
+
 Base.metadata.create_all(bind=engine)
 
+@app.on_event("startup")
+async def start_prefetcher():
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=BLOCKING_IO_THREADS))
+    prefetcher.start()
+
+@app.on_event("shutdown")
+async def stop_prefetcher():
+    await prefetcher.stop()
+    await flush_embedding_cache()
+
+def degraded_event(degradations):
+    return f"data: {json.dumps({'type': 'degraded', 'degradations': degradations})}\n\n"
+
+@app.get("/api/breakers")
+async def breakers():
+    """State of the circuit breakers guarding each upstream"""
+    return breaker_report()
+
+@app.get("/api/prefetch-stats")
+async def prefetch_stats():
+    """How often prefetched results were used and the latency they saved"""
+    return prefetcher.report()
+
 @app.post("/api/ask")
 async def ask_question(query: Query):
     """Ultra-fast answer using direct LLM (1-2s)"""
-    answer_stream, urls, follow_up_questions = await get_answer_ultra_fast(query.question)
+    deadline = new_deadline("ultra", query.budget)
+    answer_stream, urls, follow_up_questions = await get_answer_ultra_fast(query.question, deadline)
     
     async def generate():
         try:
             # Send mode info
             yield f"data: {json.dumps({'type': 'mode', 'mode': 'ultra'})}\n\n"
             
+            # Report stages that were skipped or cut short to meet the deadline
+            reported = len(deadline.degradations)
+            if reported:
+                yield degraded_event(deadline.degradations)
+            
             # First send the URLs
             yield f"data: {json.dumps({'type': 'urls', 'urls': urls})}\n\n"
             
             # Then stream the answer
             async for chunk in answer_stream:
                 yield f"data: {json.dumps({'type': 'answer', 'content': chunk})}\n\n"
+            if len(deadline.degradations) > reported:
+                yield degraded_event(deadline.degradations[reported:])
             
             # Finally send follow-up questions
             yield f"data: {json.dumps({'type': 'follow_up_questions', 'questions': follow_up_questions})}\n\n"
@@ -67,7 +118,8 @@ async def ask_question(query: Query):
 @app.post("/api/ask-deep")
 async def ask_question_deep(query: Query):
     """Deep answer using web scraping"""
-    answer_stream, urls, follow_up_questions = await get_answer_deep(query.question)
+    deadline = new_deadline("deep", query.budget)
+    answer_stream, urls, follow_up_questions = await get_answer_deep(query.question, deadline)
     
     async def generate():
         try:
@@ -77,12 +129,19 @@ async def ask_question_deep(query: Query):
             # Send status update
             yield f"data: {json.dumps({'type': 'status', 'message': 'Scraping websites for detailed information...'})}\n\n"
             
+            # Report stages that were skipped or cut short to meet the deadline
+            reported = len(deadline.degradations)
+            if reported:
+                yield degraded_event(deadline.degradations)
+            
             # First send the URLs
             yield f"data: {json.dumps({'type': 'urls', 'urls': urls})}\n\n"
             
             # Then stream the answer
             async for chunk in answer_stream:
                 yield f"data: {json.dumps({'type': 'answer', 'content': chunk})}\n\n"
+            if len(deadline.degradations) > reported:
+                yield degraded_event(deadline.degradations[reported:])
             
             # Finally send follow-up questions
             yield f"data: {json.dumps({'type': 'follow_up_questions', 'questions': follow_up_questions})}\n\n"
@@ -100,7 +159,8 @@ async def ask_question_deep(query: Query):
 @app.post("/api/ask-serp")
 async def ask_question_serp(query: Query):
     """Answer using SERP API + snippets (3-5s)"""
-    answer_stream, urls, follow_up_questions = await get_answer_fast(query.question)
+    deadline = new_deadline("serp", query.budget)
+    answer_stream, urls, follow_up_questions = await get_answer_fast(query.question, deadline)
     
     async def generate():
         try:
@@ -110,12 +170,19 @@ async def ask_question_serp(query: Query):
             # Send status update
             yield f"data: {json.dumps({'type': 'status', 'message': 'Searching the web for current information...'})}\n\n"
             
+            # Report stages that were skipped or cut short to meet the deadline
+            reported = len(deadline.degradations)
+            if reported:
+                yield degraded_event(deadline.degradations)
+            
             # First send the URLs
             yield f"data: {json.dumps({'type': 'urls', 'urls': urls})}\n\n"
             
             # Then stream the answer
             async for chunk in answer_stream:
                 yield f"data: {json.dumps({'type': 'answer', 'content': chunk})}\n\n"
+            if len(deadline.degradations) > reported:
+                yield degraded_event(deadline.degradations[reported:])
             
             # Finally send follow-up questions
             yield f"data: {json.dumps({'type': 'follow_up_questions', 'questions': follow_up_questions})}\n\n"
@@ -129,3 +196,85 @@ async def ask_question_serp(query: Query):
         generate(),
         media_type="text/event-stream"
     )
+
+@app.post("/api/ask-auto")
+async def ask_question_auto(query: Query):
+    """Answer in whichever mode the local classifier picks for the question"""
+    deadline = new_deadline("deep", query.budget)  # auto may escalate as far as deep
+    answer_stream, urls, follow_up_questions, mode = await get_answer_auto(query.question, deadline)
+    
+    async def generate():
+        try:
+            # Send the mode the router settled on
+            yield f"data: {json.dumps({'type': 'mode', 'mode': mode})}\n\n"
+            
+            # Report stages that were skipped or cut short to meet the deadline
+            reported = len(deadline.degradations)
+            if reported:
+                yield degraded_event(deadline.degradations)
+            
+            # First send the URLs
+            yield f"data: {json.dumps({'type': 'urls', 'urls': urls})}\n\n"
+            
+            # Then stream the answer
+            async for chunk in answer_stream:
+                yield f"data: {json.dumps({'type': 'answer', 'content': chunk})}\n\n"
+            if len(deadline.degradations) > reported:
+                yield degraded_event(deadline.degradations[reported:])
+            
+            # Finally send follow-up questions
+            yield f"data: {json.dumps({'type': 'follow_up_questions', 'questions': follow_up_questions})}\n\n"
+            yield f"data: [DONE]\n\n"
+        except Exception as e:
+            print(f"Error in auto streaming: {e}")
+            yield f"data: {json.dumps({'type': 'error', 'content': 'An error occurred while streaming the response.'})}\n\n"
+            yield f"data: [DONE]\n\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream"
+    )
+
+@app.post("/api/batch")
+async def create_batch(query: BatchQuery):
+    """Start answering a list of questions in the background; returns a job ID"""
+    if not query.questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    try:
+        job = create_job(query.questions, query.mode, query.concurrency, query.budget)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job.progress()
+
+def get_batch_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job
+
+@app.get("/api/batch/{job_id}")
+async def get_batch(job_id: str, offset: int = 0, limit: int = 50):
+    """Progress plus a page of results, in completion order"""
+    job = get_batch_job(job_id)
+    return {**job.progress(), "offset": offset, "results": job.page(offset, limit)}
+
+@app.get("/api/batch/{job_id}/stream")
+async def stream_batch(job_id: str):
+    """Stream results as they complete, then the final progress"""
+    job = get_batch_job(job_id)
+    
+    async def generate():
+        try:
+            async for result in iter_results(job):
+                yield f"data: {json.dumps({'type': 'result', **result})}\n\n"
+            yield f"data: {json.dumps({'type': 'progress', **job.progress()})}\n\n"
+            yield f"data: [DONE]\n\n"
+        except Exception as e:
+            print(f"Error in batch streaming: {e}")
+            yield f"data: {json.dumps({'type': 'error', 'content': 'An error occurred while streaming the batch.'})}\n\n"
+            yield f"data: [DONE]\n\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream"
+    )
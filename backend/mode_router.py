@@ -0,0 +1,193 @@
+import json
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from .hybrid_store import tokenize
+
+MODES = ("ultra", "serp", "deep")
+ROUTING_LOG_FILE = os.getenv(
+    "ROUTING_LOG_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_log.jsonl")
+)
+# Appends log lines off the event loop, in order
+log_writer = ThreadPoolExecutor(max_workers=1)
+
+# Below this confidence the classifier's pick is bumped one mode up
+MIN_CONFIDENCE = 0.5
+# Fraction of question terms the snippets must cover for SERP mode to be enough
+MIN_SNIPPET_COVERAGE = 0.5
+MIN_SNIPPETS = 2
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "for", "to",
+    "and", "or", "what", "who", "how", "why", "when", "where", "which", "do", "does",
+    "did", "i", "you", "it", "its", "me", "my", "can", "should", "with", "about", "vs",
+}
+
+RECENCY_PATTERN = re.compile(
+    r"\b(today|tonight|yesterday|latest|current(ly)?|now|recent(ly)?|this (week|month|year)|"
+    r"news|price|stock|score|weather|release date|20[2-9]\d)\b"
+)
+DEPTH_PATTERN = re.compile(
+    r"\b(compare|comparison|in detail|in depth|detailed|analy[sz]e|analysis|pros and cons|"
+    r"trade-?offs?|review|research|comprehensive|step by step|differences? between|impact of)\b"
+)
+
+# Seed set for the local model: short, representative questions per mode
+TRAINING_EXAMPLES = [
+    ("what is the capital of france", "ultra"),
+    ("explain how photosynthesis works", "ultra"),
+    ("what does http stand for", "ultra"),
+    ("define entropy in thermodynamics", "ultra"),
+    ("write a python function to reverse a list", "ultra"),
+    ("who wrote pride and prejudice", "ultra"),
+    ("what is the pythagorean theorem", "ultra"),
+    ("how do i convert celsius to fahrenheit", "ultra"),
+    ("what is a closure in javascript", "ultra"),
+    ("translate good morning into spanish", "ultra"),
+    ("what is the weather in london today", "serp"),
+    ("latest news about the stock market", "serp"),
+    ("who won the game last night", "serp"),
+    ("current price of bitcoin", "serp"),
+    ("when is the next iphone release date", "serp"),
+    ("opening hours of the louvre", "serp"),
+    ("what time is it in tokyo now", "serp"),
+    ("who is the current ceo of openai", "serp"),
+    ("exchange rate usd to eur today", "serp"),
+    ("score of the champions league final", "serp"),
+    ("compare postgres and mysql for analytics workloads in detail", "deep"),
+    ("detailed analysis of the impact of interest rates on housing", "deep"),
+    ("pros and cons of kubernetes versus serverless for startups", "deep"),
+    ("comprehensive review of recent research on long covid", "deep"),
+    ("what are the differences between the eu and us ai regulations", "deep"),
+    ("analyze the trade-offs of rust vs go for backend services", "deep"),
+    ("in depth comparison of the best noise cancelling headphones this year", "deep"),
+    ("explain step by step how to migrate a monolith to microservices with examples", "deep"),
+    ("summarize the latest research on solid state batteries", "deep"),
+    ("what is the impact of the new tariffs on electronics prices", "deep"),
+]
+
+
+def content_terms(text):
+    return [t for t in tokenize(text) if t not in STOPWORDS]
+
+
+class NaiveBayesModeClassifier:
+    """Multinomial naive Bayes over question terms; trains in milliseconds"""
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+        self.class_counts = Counter()
+        self.term_counts = defaultdict(Counter)
+        self.vocab = set()
+
+    def fit(self, examples):
+        for text, mode in examples:
+            self.class_counts[mode] += 1
+            for term in content_terms(text):
+                self.term_counts[mode][term] += 1
+                self.vocab.add(term)
+        return self
+
+    def log_scores(self, text):
+        total = sum(self.class_counts.values())
+        terms = content_terms(text)
+        scores = {}
+        for mode in MODES:
+            counts = self.term_counts[mode]
+            denom = sum(counts.values()) + self.alpha * len(self.vocab)
+            score = math.log((self.class_counts[mode] + self.alpha) / (total + self.alpha * len(MODES)))
+            for term in terms:
+                if term in self.vocab:
+                    score += math.log((counts[term] + self.alpha) / denom)
+            scores[mode] = score
+        return scores
+
+
+_model = NaiveBayesModeClassifier().fit(TRAINING_EXAMPLES)
+
+
+def heuristic_scores(question):
+    """Log-space nudges from patterns the seed set is too small to learn"""
+    text = question.lower()
+    scores = {mode: 0.0 for mode in MODES}
+    if RECENCY_PATTERN.search(text):
+        scores["serp"] += 2.0
+    if DEPTH_PATTERN.search(text):
+        scores["deep"] += 2.5
+    if len(content_terms(text)) > 12:
+        scores["deep"] += 1.0
+    return scores
+
+
+def classify_question(question):
+    """Pick a mode without any network call. Returns (mode, confidence, probabilities)"""
+    model_scores = _model.log_scores(question)
+    nudges = heuristic_scores(question)
+    combined = {mode: model_scores[mode] + nudges[mode] for mode in MODES}
+
+    top = max(combined.values())
+    exp_scores = {mode: math.exp(score - top) for mode, score in combined.items()}
+    norm = sum(exp_scores.values())
+    probabilities = {mode: exp_scores[mode] / norm for mode in MODES}
+
+    mode = max(probabilities, key=probabilities.get)
+    return mode, probabilities[mode], probabilities
+
+
+def escalate(mode):
+    index = MODES.index(mode)
+    return MODES[min(index + 1, len(MODES) - 1)]
+
+
+def snippet_coverage(question, search_results):
+    """Fraction of the question's content terms that appear in any snippet"""
+    terms = set(content_terms(question))
+    if not terms:
+        return 1.0
+    covered = set()
+    for result in search_results:
+        covered.update(tokenize(f"{result.get('title', '')} {result.get('snippet', '')}"))
+    return len(terms & covered) / len(terms)
+
+
+def snippets_sufficient(question, search_results):
+    with_snippets = [r for r in search_results if r.get("snippet")]
+    if len(with_snippets) < MIN_SNIPPETS:
+        return False
+    return snippet_coverage(question, with_snippets) >= MIN_SNIPPET_COVERAGE
+
+
+def routing_decision(question, predicted, confidence, final, escalations, started_at):
+    """Log entry for a routing decision; completed by log_routing_outcome"""
+    print(f"Routed to {final} (predicted {predicted} @ {confidence:.2f}, escalations: {escalations})")
+    return {
+        "ts": time.time(),
+        "question": question,
+        "predicted": predicted,
+        "confidence": round(confidence, 3),
+        "mode": final,
+        "escalations": escalations,
+        "routing_ms": round((time.perf_counter() - started_at) * 1000, 1),
+    }
+
+
+def log_routing_outcome(entry, outcome, started_at, degradations=()):
+    """Record how the routed request ended ("ok", "degraded", "error" or
+    "disconnected") and its end-to-end latency, then append it to the log"""
+    entry.update({
+        "outcome": outcome,
+        "latency_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        "degradations": [f"{d['stage']} -> {d['fallback']}" for d in degradations],
+    })
+    log_writer.submit(append_log_entry, entry)
+
+
+def append_log_entry(entry):
+    try:
+        with open(ROUTING_LOG_FILE, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"[ERROR] Failed to write routing log: {e}")
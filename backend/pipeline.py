@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+_NO_DEFAULT = object()
+
+
+class StageError(Exception):
+    """A required stage failed, timed out or lost one of its dependencies"""
+
+    def __init__(self, stage, cause):
+        super().__init__(f"Stage '{stage}' failed: {cause!r}")
+        self.stage = stage
+        self.cause = cause
+
+
+class Stage:
+    def __init__(self, name, fn, deps=(), timeout=None, default=_NO_DEFAULT):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.default = default
+        self.start = None
+        self.end = None
+        self.status = "pending"
+
+    @property
+    def required(self):
+        return self.default is _NO_DEFAULT
+
+    @property
+    def duration(self):
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+
+class Pipeline:
+    """Small DAG of async stages: each starts as soon as its dependencies finish.
+
+    A stage receives its dependencies' results as keyword arguments. Stages
+    with a `default` are optional: on error or timeout the default is used
+    instead. A failing required stage cancels everything still running.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+        self.results = {}
+        self.started_at = None
+
+    def add(self, name, fn, deps=(), timeout=None, default=_NO_DEFAULT):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = Stage(name, fn, deps, timeout, default)
+        return self
+
+    async def run(self):
+        self.started_at = time.perf_counter()
+        tasks = {}
+        for name, stage in self.stages.items():
+            tasks[name] = asyncio.create_task(self._run_stage(stage, tasks))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            self.print_report()
+        return self.results
+
+    async def _run_stage(self, stage, tasks):
+        try:
+            for dep in stage.deps:
+                await asyncio.shield(tasks[dep])
+        except asyncio.CancelledError:
+            stage.status = "cancelled"
+            raise
+        except Exception as e:
+            stage.status = "skipped"
+            if stage.required:
+                raise StageError(stage.name, e) from e
+            self.results[stage.name] = stage.default
+            return stage.default
+
+        stage.start = time.perf_counter()
+        kwargs = {dep: self.results[dep] for dep in stage.deps}
+        # A callable timeout is evaluated now, e.g. against a request deadline
+        timeout = stage.timeout() if callable(stage.timeout) else stage.timeout
+        try:
+            result = await asyncio.wait_for(stage.fn(**kwargs), timeout=timeout)
+            stage.status = "done"
+        except asyncio.CancelledError:
+            stage.status = "cancelled"
+            raise
+        except Exception as e:
+            stage.status = "timeout" if isinstance(e, asyncio.TimeoutError) else "failed"
+            if stage.required:
+                raise StageError(stage.name, e) from e
+            print(f"[{self.name}] optional stage '{stage.name}' {stage.status}: {e!r}")
+            result = stage.default
+        finally:
+            stage.end = time.perf_counter()
+
+        self.results[stage.name] = result
+        return result
+
+    def critical_path(self):
+        """Chain of stages that determined total latency, earliest first"""
+        finished = [s for s in self.stages.values() if s.end is not None and s.status != "cancelled"]
+        if not finished:
+            return []
+        path = []
+        stage = max(finished, key=lambda s: s.end)
+        while stage is not None:
+            path.append(stage)
+            deps = [self.stages[d] for d in stage.deps if self.stages[d] in finished]
+            stage = max(deps, key=lambda s: s.end) if deps else None
+        return list(reversed(path))
+
+    def status(self, name):
+        return self.stages[name].status
+
+    def report(self):
+        return {
+            "pipeline": self.name,
+            "stages": {
+                s.name: {
+                    "status": s.status,
+                    "start_ms": round((s.start - self.started_at) * 1000, 1) if s.start is not None else None,
+                    "duration_ms": round(s.duration * 1000, 1),
+                }
+                for s in self.stages.values()
+            },
+            "critical_path": [s.name for s in self.critical_path()],
+        }
+
+    def print_report(self):
+        path = " -> ".join(
+            f"{s.name} {s.duration * 1000:.0f}ms" for s in self.critical_path()
+        )
+        print(f"[{self.name}] critical path: {path or 'n/a'}")
@@ -0,0 +1,147 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter, OrderedDict, deque
+
+# Lower number = more urgent
+PRIORITY_FOLLOWUP = 0
+PRIORITY_TRENDING = 1
+
+
+class CallBudget:
+    """Sliding-window cap on external calls (search, page fetches, embeddings) spent speculatively"""
+
+    def __init__(self, max_calls, window=60.0):
+        self.max_calls = max_calls
+        self.window = window
+        self.calls = deque()
+
+    def try_spend(self, n=1):
+        now = time.monotonic()
+        while self.calls and now - self.calls[0] > self.window:
+            self.calls.popleft()
+        if len(self.calls) + n > self.max_calls:
+            return False
+        self.calls.extend([now] * n)
+        return True
+
+
+class PrefetchWorker:
+    """Background worker that warms caches for questions users are likely to ask next.
+
+    `job(question, budget)` does the speculative work and returns True if it
+    actually fetched something (False when everything was already cached or
+    the budget ran out). `key_fn` maps a question to the cache key the
+    request path later looks up, so hits on prefetched entries can be counted.
+    """
+
+    def __init__(self, job, key_fn, max_queue=50, budget=None,
+                 trending_interval=60.0, trending_top_k=5, recent_size=200):
+        self.job = job
+        self.key_fn = key_fn
+        self.max_queue = max_queue
+        self.budget = budget or CallBudget(max_calls=60)
+        self.trending_interval = trending_interval
+        self.trending_top_k = trending_top_k
+
+        self.heap = []  # (priority, seq, key, question)
+        self.queued = set()
+        self.seq = itertools.count()
+        self.ready = asyncio.Event()
+        self.recent = deque(maxlen=recent_size)
+        self.prefetched = OrderedDict()  # key -> seconds the prefetch took
+        self.max_prefetched = 1000
+        self.task = None
+        self.stats = Counter()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def record_question(self, question):
+        """Note a user question so frequent ones get re-warmed"""
+        self.recent.append(question.strip())
+
+    def submit(self, question, priority=PRIORITY_FOLLOWUP):
+        key = self.key_fn(question)
+        if key in self.queued or key in self.prefetched:
+            return False
+        if len(self.heap) >= self.max_queue:
+            worst = max(self.heap)
+            if priority >= worst[0]:
+                self.stats["dropped_full"] += 1
+                return False
+            # Evict the least urgent (and, within a priority, newest) entry
+            self.heap.remove(worst)
+            heapq.heapify(self.heap)
+            self.queued.discard(worst[2])
+            self.stats["dropped_full"] += 1
+        heapq.heappush(self.heap, (priority, next(self.seq), key, question))
+        self.queued.add(key)
+        self.stats["submitted"] += 1
+        self.ready.set()
+        return True
+
+    def mark_used(self, key):
+        """Called by the request path on lookup; counts a hit if the key was prefetched"""
+        duration = self.prefetched.pop(key, None)
+        if duration is None:
+            return False
+        self.stats["used"] += 1
+        self.stats["saved_ms"] += int(duration * 1000)
+        return True
+
+    def enqueue_trending(self):
+        for question, count in Counter(self.recent).most_common(self.trending_top_k):
+            if count > 1:
+                self.submit(question, PRIORITY_TRENDING)
+
+    async def run(self):
+        last_trending = time.monotonic()
+        while True:
+            if time.monotonic() - last_trending >= self.trending_interval:
+                self.enqueue_trending()
+                last_trending = time.monotonic()
+
+            if not self.heap:
+                self.ready.clear()
+                try:
+                    await asyncio.wait_for(self.ready.wait(), timeout=self.trending_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, key, question = heapq.heappop(self.heap)
+            self.queued.discard(key)
+            start = time.perf_counter()
+            try:
+                fetched = await self.job(question, self.budget)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ERROR] Prefetch failed for '{question}': {e}")
+                self.stats["failed"] += 1
+                continue
+
+            if not fetched:
+                self.stats["skipped"] += 1
+                continue
+            self.prefetched[key] = time.perf_counter() - start
+            if len(self.prefetched) > self.max_prefetched:
+                self.prefetched.popitem(last=False)
+            self.stats["completed"] += 1
+
+    def report(self):
+        completed = self.stats["completed"]
+        return {
+            **self.stats,
+            "queued": len(self.heap),
+            "hit_rate": round(self.stats["used"] / completed, 3) if completed else 0.0,
+        }
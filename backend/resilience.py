@@ -0,0 +1,118 @@
+import asyncio
+import time
+from urllib.parse import urlparse
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+
+class Deadline:
+    """Latency budget for one request, plus the degradations taken to meet it"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self.degradations = []
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, cap=None, reserve=0.0):
+        """Time a stage may take: what is left minus `reserve`, at most `cap`"""
+        available = max(0.0, self.remaining() - reserve)
+        return available if cap is None else min(cap, available)
+
+    def degrade(self, stage, fallback, reason):
+        print(f"Degraded {stage} -> {fallback}: {reason}")
+        self.degradations.append({"stage": stage, "fallback": fallback, "reason": reason})
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; after `reset_timeout`
+    lets one trial call through (half-open) and closes again if it succeeds"""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                print(f"Circuit breaker '{self.name}' opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+
+breakers = {}
+
+
+def get_breaker(name, **kwargs):
+    if name not in breakers:
+        breakers[name] = CircuitBreaker(name, **kwargs)
+    return breakers[name]
+
+
+def site_breaker(url):
+    # Sites fail more independently than shared APIs; trip faster
+    return get_breaker(f"site:{urlparse(url).netloc}", failure_threshold=2, reset_timeout=120.0)
+
+
+async def call_with_breaker(breaker, make_coro, timeout=None, count_timeout=True):
+    """Await `make_coro()` under `breaker` and an optional timeout.
+
+    Pass count_timeout=False when the timeout was shortened by the request's
+    own deadline, so a tight budget does not count against the upstream.
+    """
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit breaker '{breaker.name}' is open")
+    try:
+        result = await asyncio.wait_for(make_coro(), timeout=timeout)
+    except asyncio.CancelledError:
+        breaker.trial_in_flight = False
+        raise
+    except asyncio.TimeoutError:
+        if count_timeout:
+            breaker.record_failure()
+        else:
+            breaker.trial_in_flight = False
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+def breaker_report():
+    return {name: {"state": b.state, "failures": b.failures} for name, b in breakers.items()}
@@ -5,22 +5,30 @@ import requests
 
 
 async def scrape_url_async(session, url, timeout=5):
-    """Async version of scraper with reduced timeout"""
+    """Async version of scraper with reduced timeout.
+
+    Returns None if the fetch failed and "" if no article text was found.
+    """
     try:
         async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
             response.raise_for_status()
             html = await response.text()
-            
-            extractor = extractors.ArticleExtractor()
-            content = extractor.get_content(html)
-            return content.strip()
     except Exception as e:
         print(f"[ERROR] Failed to fetch {url}: {e}")
+        return None
+
+    try:
+        extractor = extractors.ArticleExtractor()
+        content = extractor.get_content(html)
+        return content.strip()
+    except Exception as e:
+        print(f"[ERROR] Failed to extract {url}: {e}")
         return ""
 
 
-async def scrape_urls_parallel(urls, max_concurrent=3):
-    """Scrape multiple URLs in parallel"""
+async def scrape_urls_by_url(urls, max_concurrent=3):
+    """Scrape multiple URLs in parallel, returning {url: text}: None where the
+    fetch failed, "" where no article text was found"""
     connector = aiohttp.TCPConnector(
         limit=max_concurrent,
         ssl=False,  # Disable SSL verification for now
@@ -36,15 +44,20 @@ async def scrape_urls_parallel(urls, max_concurrent=3):
         tasks = [scrape_url_async(session, url) for url in urls]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        # Filter out exceptions and empty results
-        valid_results = []
-        for i, result in enumerate(results):
+        pages = {}
+        for url, result in zip(urls, results):
             if isinstance(result, Exception):
-                print(f"Error scraping {urls[i]}: {result}")
-            elif result:
-                valid_results.append(result)
-        
-        return valid_results
+                print(f"Error scraping {url}: {result}")
+                result = None
+            pages[url] = result
+        return pages
+
+
+async def scrape_urls_parallel(urls, max_concurrent=3):
+    """Scrape multiple URLs in parallel"""
+    pages = await scrape_urls_by_url(urls, max_concurrent)
+    # Filter out failed and empty results
+    return [text for text in pages.values() if text]
 
 
 def scrape_url(url):
@@ -24,6 +24,9 @@ def chunk_text(text, max_tokens=500):
     print(f"Chunked {len(words)} words into {len(chunks)} chunks")
     return chunks
             
+def count_tokens(text):
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
 def get_embedding(text, model="text-embedding-3-small"):
     text = text.replace("\n", " ").strip()
     response = client.embeddings.create(input=[text], model=model)